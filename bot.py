@@ -6,6 +6,8 @@ from pyrogram import Client, filters
 from pyrogram.types import BotCommand
 from config import API_ID, API_HASH, BOT_TOKEN, DOWNLOAD_DIR
 from database.database import init_db
+from utils.worker_pool import shutdown_pool
+from utils.backends import select_backends
 
 # Health check port for Koyeb
 HEALTH_CHECK_PORT = int(os.environ.get("PORT", 8000))
@@ -98,6 +100,13 @@ if __name__ == "__main__":
         # Start health check server for Koyeb
         await start_health_server()
         await set_bot_commands()
+        
+        # Pick the fastest extraction backend per format
+        try:
+            backends = await select_backends()
+            print(f"Extraction backends: {backends}")
+        except Exception as e:
+            print(f"Backend benchmark failed, using Python readers: {e}")
     
     app.start()
     app.loop.run_until_complete(on_startup())
@@ -109,5 +118,6 @@ if __name__ == "__main__":
     from pyrogram import idle
     idle()
     app.stop()
+    shutdown_pool()
 
 
@@ -19,6 +19,56 @@ DATABASE_NAME = os.getenv("DATABASE_NAME", "unzip_bot")
 DOWNLOAD_DIR = "downloads"
 MAX_CONCURRENT_DOWNLOADS = 3
 
+# Archive Cache (downloaded files kept by file_unique_id for retries and repeat requests)
+ARCHIVE_CACHE_DIR = "archive_cache"
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_MB", "10240")) * 1024 * 1024  # Idle archives are dropped past this
+ARCHIVE_CACHE_TTL_SECONDS = 6 * 60 * 60  # Idle archives older than this are dropped
+
+# Extraction Workers
+# Number of worker processes used for decompression (7z folders decode in parallel)
+MAX_WORKER_PROCESSES = int(os.getenv("MAX_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+
+# Memory ceiling per extraction job (worker process or native tool), 0 to disable
+JOB_MEMORY_LIMIT_BYTES = int(os.getenv("JOB_MEMORY_LIMIT_MB", "512")) * 1024 * 1024
+
+# Buffer size used when writing extracted members to disk
+EXTRACT_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Nested Archives (archives inside archives)
+MAX_NESTED_DEPTH = 3  # Levels of nesting extracted in recursive mode
+MAX_NESTED_TOTAL_BYTES = 4 * 1024 * 1024 * 1024  # 4 GB extra data from nested archives
+
+# Largest file a bot can upload (Telegram limit is 2000 MiB)
+UPLOAD_LIMIT_BYTES = 2000 * 1024 * 1024
+
+# Photos/videos per album in media upload mode (Telegram limit)
+MEDIA_GROUP_LIMIT = 10
+
+# Photo Limits (larger photos are downscaled, or sent as documents)
+PHOTO_MAX_BYTES = 10 * 1024 * 1024  # Telegram photo size limit
+PHOTO_MAX_SIDE_SUM = 10000  # Width + height limit
+PHOTO_MAX_RATIO = 20  # Aspect ratio limit
+PHOTO_DOWNSCALE_SIDE = 2560  # Longest side after downscaling (largest size Telegram shows)
+
+# Custom Thumbnail Cache
+THUMB_CACHE_DIR = "thumb_cache"
+THUMB_CACHE_MAX_BYTES = 50 * 1024 * 1024  # Least recently used thumbnails are dropped past this
+THUMB_SIDE = 320  # Telegram thumbnails are at most 320x320
+
+# Auto Thumbnails (previews for images sent as documents)
+AUTO_THUMB_BATCH = 8  # Images per worker job
+AUTO_THUMB_LOOKAHEAD = 2  # Batches prepared ahead of the upload loop
+AUTO_THUMB_WAIT_SECONDS = 0.5  # Longest an upload waits for its thumbnail
+AUTO_THUMB_MAX_SOURCE_BYTES = 30 * 1024 * 1024  # Bigger images are sent without a preview
+
+# Small-file Bundles (delivery mode for archives with many tiny files)
+BUNDLE_MEMBER_MAX_BYTES = 5 * 1024 * 1024  # Members under 5 MB are bundled
+BUNDLE_TARGET_BYTES = 200 * 1024 * 1024  # Target size of one bundle zip
+
+# /zip Jobs (pack files the user sent)
+ZIP_MAX_FILES = 100  # Files packed by one /zip
+ZIP_HISTORY_FILES = 500  # Recent files remembered per user for /zip
+
 # User Tier Limits
 # Format: {tier: {"daily_files": count, "max_size_bytes": size}}
 USER_LIMITS = {
@@ -51,11 +101,16 @@ PREMIUM_PLANS = {
     }
 }
 
+# Password Keyring
+# Secret used to encrypt saved archive passwords (falls back to the bot token)
+KEYRING_SECRET = os.getenv("KEYRING_SECRET", BOT_TOKEN)
+MAX_KEYRING_PASSWORDS = 10
+
 # Force Subscription
 MAX_FORCE_SUB_CHANNELS = 4
 
 # File Types
-SUPPORTED_EXTENSIONS = ['.zip', '.rar', '.7z', '.tar', '.gz', '.bz2']
+SUPPORTED_EXTENSIONS = ['.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz', '.tgz', '.tbz2', '.txz']
 
 # Messages
 START_MESSAGE = """
@@ -91,6 +146,7 @@ HELP_MESSAGE = """
 2️⃣ **Extract the File:**
    • Reply to the file with `/unzip`
    • For password-protected files: `/unzip "your_password"`
+   • Not sure which password? `/unzip "pass1" "pass2"` tries them all
 
 3️⃣ **Receive Files:**
    • Bot will extract and send all files to you
@@ -100,6 +156,9 @@ HELP_MESSAGE = """
 /start - Start the bot
 /help - Show this help message
 /unzip - Extract file (reply to file message)
+/test - Check an archive for corruption without extracting
+/convert - Repackage an archive as ZIP (or `/convert tar.zst`)
+/zip - Pack the files you sent (reply to the first one)
 /myplan - Check current plan and usage
 /premium - View premium plans
 /redeem - Redeem premium code
@@ -114,5 +173,6 @@ HELP_MESSAGE = """
 Get premium codes and redeem with `/redeem CODE123`
 
 **Supported Formats:**
-.zip, .rar, .7z, .tar, .gz, .bz2
+.zip, .rar, .7z, .tar, .gz, .bz2, .xz
+(single .gz/.bz2/.xz files like `data.csv.gz` work too)
 """
@@ -70,11 +70,19 @@ UserSettings Collection:
     "user_id": int,  # unique
     "upload_as_document": bool,  # True for document, False for media
     "custom_caption": str or None,  # Caption template with variables
-    "caption_entities": list or None,  # Telegram MessageEntity objects for formatting
-    "thumbnail": str or None,  # file_id of thumbnail image
+    "caption_entities": list or None,  # Formatting entities: {"type": "bold", "offset", "length"} in UTF-16 units, plus url/language/custom_emoji_id when set
+    "thumbnail": str or None,  # file_id of thumbnail image (cached as a 320px JPEG by file_unique_id)
     "caption_replacements": str,  # Pipe-separated: "old:new | word"
     "filename_replacements": str,  # Pipe-separated: "old:new | word"
     "filename_prefix": str or None,  # Prefix (space added automatically)
-    "filename_suffix": str or None  # Suffix (space added automatically, before extension)
+    "filename_suffix": str or None,  # Suffix (space added automatically, before extension)
+    "extract_nested": bool,  # Also extract archives found inside the archive
+    "send_checksums": bool,  # Send a SHA-256 checksum file after extraction
+    "bundle_small_files": bool,  # Deliver small members in a few zip bundles
+    "include_patterns": str,  # Comma-separated globs, only matching members are extracted
+    "exclude_patterns": str,  # Comma-separated globs ("dir/" matches a folder), never extracted
+    "min_member_size": int or None,  # Skip members smaller than this many bytes
+    "max_member_size": int or None,  # Skip members larger than this many bytes
+    "password_keyring": str or None  # AES-GCM encrypted JSON list of saved archive passwords
 }
 """
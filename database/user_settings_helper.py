@@ -11,7 +11,15 @@ def get_default_settings():
         "caption_replacements": "",
         "filename_replacements": "",
         "filename_prefix": None,
-        "filename_suffix": None
+        "filename_suffix": None,
+        "extract_nested": False,
+        "send_checksums": False,
+        "bundle_small_files": False,
+        "include_patterns": "",
+        "exclude_patterns": "",
+        "min_member_size": None,
+        "max_member_size": None,
+        "password_keyring": None
     }
 
 
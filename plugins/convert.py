@@ -0,0 +1,256 @@
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from plugins.force_sub import check_force_subscription
+from plugins.cancel import start_process, end_process, is_cancelled
+from plugins.unzip import (
+    progress_callback, parse_passwords, resolve_password, handle_telegram_link, send_in_parts, get_log_channel
+)
+from utils.quota_manager import check_user_quota, check_file_size, increment_user_quota
+from utils.file_handler import cleanup_files
+from utils.archive_cache import acquire_archive, release_archive
+from utils.helpers import format_size
+from utils.worker_pool import run_in_pool_with_progress
+from utils.converter import CONVERT_TARGETS, available_targets, converted_name, convert_archive
+from utils.probe import probe_download
+from utils.keyring import get_keyring_passwords
+from utils.thumbnails import get_thumbnail, release_thumbnail
+from database.user_settings_helper import get_user_settings
+from config import UPLOAD_LIMIT_BYTES
+import os
+import time
+import random
+import asyncio
+
+
+@Client.on_message(filters.command("convert") & filters.private)
+async def convert_command(client: Client, message: Message):
+    """Handle /convert command - repackage an archive as zip or tar.zst"""
+    user_id = message.from_user.id
+
+    # Check force subscription
+    is_subscribed, buttons = await check_force_subscription(client, user_id)
+    if not is_subscribed:
+        await message.reply_text(
+            "❌ **Access Denied!**\n\n"
+            "You must join the following channels to use this bot:",
+            reply_markup=buttons
+        )
+        return
+
+    targets = available_targets()
+    replied_msg = message.reply_to_message
+    if not replied_msg or (not replied_msg.document and not replied_msg.text):
+        await message.reply_text(
+            "❌ **Invalid Usage!**\n\n"
+            "Reply to an archive or Telegram file link with:\n"
+            "• `/convert` - repackage as ZIP\n"
+            + ("• `/convert tar.zst` - repackage as TAR.ZST\n" if 'tar.zst' in targets else "") +
+            "• `/convert zip \"password\"` - for password-protected files"
+        )
+        return
+
+    # /convert [format] ["password" ...]
+    target = 'zip'
+    args = message.text.split(maxsplit=2)
+    if len(args) > 1 and args[1].lower() in CONVERT_TARGETS:
+        target = args[1].lower()
+        passwords = parse_passwords(f"/convert {args[2]}" if len(args) > 2 else "/convert")
+    else:
+        passwords = parse_passwords(message.text)
+
+    if target not in targets:
+        await message.reply_text(f"❌ `{target}` output isn't available on this server.")
+        return
+
+    async def handler(client, message, file_message, passwords):
+        await handle_file_conversion(client, message, file_message, passwords, target)
+
+    if replied_msg.text and 't.me/' in replied_msg.text:
+        await handle_telegram_link(client, message, replied_msg.text, passwords, handler=handler)
+        return
+
+    if replied_msg.document:
+        await handler(client, message, replied_msg, passwords)
+        return
+
+    await message.reply_text("❌ No valid file or link found in the replied message!")
+
+
+async def handle_file_conversion(client: Client, message: Message, file_message: Message, passwords: list,
+                                 target: str):
+    """Download an archive and re-encode it in one streaming pass"""
+    user_id = message.from_user.id
+
+    file = file_message.document
+    file_name = file.file_name
+    file_size = file.file_size
+
+    ext = file_name.lower().rsplit('.', 1)[-1] if '.' in file_name else ''
+    supported_exts = ['zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz', 'tgz', 'tbz2', 'txz']
+
+    if ext not in supported_exts:
+        await message.reply_text(
+            f"❌ **Unsupported File Type!**\n\n"
+            f"File: `{file_name}`\n"
+            f"Extension: `.{ext}`\n\n"
+            f"Please send only compressed files:\n"
+            f".zip, .rar, .7z, .tar, .gz, .bz2, .xz"
+        )
+        return
+
+    output_name = converted_name(file_name, target)
+    if output_name.lower() == file_name.lower():
+        await message.reply_text(f"❌ `{file_name}` is already a {target.upper()} file!")
+        return
+
+    # Check user quota
+    can_proceed, quota_msg, tier = check_user_quota(user_id)
+    if not can_proceed:
+        await message.reply_text(quota_msg)
+        return
+
+    # Check file size
+    can_proceed, size_msg = check_file_size(user_id, file_size)
+    if not can_proceed:
+        await message.reply_text(size_msg)
+        return
+
+    start_process(user_id, 'conversion', filename=file_name)
+
+    status_msg = await message.reply_text(
+        f"**🔁 Converting Archive**\n\n"
+        f"**File:** `{file_name}`\n"
+        f"**Size:** {format_size(file_size)}\n"
+        f"**To:** {target.upper()}\n\n"
+        f"⏳ Starting download...\n\n"
+        f"Use /cancel to stop"
+    )
+
+    file_path = None
+    output_path = None
+    thumb_path = None
+    settings = get_user_settings(user_id)
+
+    try:
+        start_time = time.time()
+
+        async def progress_wrapper(current, total):
+            await progress_callback(current, total, status_msg, start_time, user_id, "Downloading")
+
+        file_path, probe_error = await acquire_archive(
+            client, file_message, progress_wrapper,
+            check=lambda: probe_download(client, file_message, file_size, ext, file_name)
+        )
+        if probe_error:
+            await status_msg.edit_text(probe_error)
+            return
+
+        if not file_path:
+            await status_msg.edit_text("❌ Failed to download file!")
+            return
+
+        if is_cancelled(user_id):
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            return
+
+        await status_msg.edit_text("🔐 Checking archive...\n\nUse /cancel to stop")
+        password, error_msg = await resolve_password(
+            file_path, ext, passwords, keyring=get_keyring_passwords(settings)
+        )
+        if error_msg:
+            await status_msg.edit_text(error_msg)
+            return
+
+        # Members are decoded straight into the new archive, nothing is extracted
+        output_path = f"downloads/conv_{random.randint(100000, 999999)}{CONVERT_TARGETS[target]}"
+        convert_running = True
+        convert_progress = {}
+        async def update_convert_status():
+            elapsed = 0
+            while convert_running:
+                await asyncio.sleep(5)
+                if convert_running:
+                    elapsed += 5
+                    percent = convert_progress.get('percent')
+                    done = f" {percent}%" if percent is not None else ""
+                    try:
+                        await status_msg.edit_text(
+                            f"🔁 Converting to {target.upper()}...{done} ({elapsed}s)\n\n"
+                            f"Use /cancel to stop"
+                        )
+                    except:
+                        pass
+
+        await status_msg.edit_text(f"🔁 Converting to {target.upper()}...\n\nUse /cancel to stop")
+        status_task = asyncio.create_task(update_convert_status())
+        try:
+            member_count, skipped_count = await run_in_pool_with_progress(
+                convert_archive, convert_progress, file_path, password, ext, target, output_path, file_name
+            )
+        finally:
+            convert_running = False
+            status_task.cancel()
+            try:
+                await status_task
+            except asyncio.CancelledError:
+                pass
+
+        # The source isn't needed any more - let the cache evict it while uploading
+        release_archive(file_path)
+        file_path = None
+
+        if is_cancelled(user_id):
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            return
+
+        output_size = os.path.getsize(output_path)
+        await status_msg.edit_text(
+            f"📤 Uploading `{output_name}` ({format_size(output_size)})...\n\nUse /cancel to stop"
+        )
+
+        log_channel_id = await get_log_channel()
+        thumb_path = await get_thumbnail(client, settings.get('thumbnail'))
+
+        if output_size > UPLOAD_LIMIT_BYTES:
+            await send_in_parts(client, user_id, output_path, output_size, output_name, thumb_path, log_channel_id)
+        else:
+            sent_msg = await client.send_document(
+                chat_id=user_id,
+                document=output_path,
+                file_name=output_name,
+                caption=f"🔁 `{file_name}` → {target.upper()}",
+                thumb=thumb_path
+            )
+            if log_channel_id and sent_msg:
+                try:
+                    await sent_msg.copy(log_channel_id)
+                except Exception:
+                    pass
+
+        increment_user_quota(user_id, file_name, file_size)
+
+        skipped_note = f"\n⚠️ **Skipped:** {skipped_count} file(s) with unsafe names" if skipped_count else ""
+        await status_msg.edit_text(
+            f"✅ **Conversion Complete!**\n\n"
+            f"**Archive:** `{file_name}`\n"
+            f"**Converted:** {member_count} file(s) → `{output_name}`\n"
+            f"**Size:** {format_size(file_size)} → {format_size(output_size)}"
+            f"{skipped_note}"
+        )
+
+    except Exception as e:
+        if "cancelled" in str(e).lower():
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+        elif 'password' in str(e).lower():
+            await status_msg.edit_text(f"❌ Incorrect password or password required\n\nError: {str(e)}")
+        else:
+            await status_msg.edit_text(f"❌ Conversion error: {str(e)}")
+
+    finally:
+        end_process(user_id)
+
+        if file_path:
+            release_archive(file_path)
+        if output_path:
+            await cleanup_files([output_path])
+        release_thumbnail(thumb_path)
@@ -0,0 +1,210 @@
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from plugins.force_sub import check_force_subscription
+from plugins.cancel import start_process, end_process, is_cancelled
+from plugins.unzip import progress_callback, parse_passwords, resolve_password, handle_telegram_link
+from utils.quota_manager import check_file_size
+from utils.archive_cache import acquire_archive, release_archive
+from utils.helpers import format_size
+from utils.integrity import test_archive
+from utils.probe import probe_download
+from utils.keyring import get_keyring_passwords
+from database.user_settings_helper import get_user_settings
+import time
+import asyncio
+
+
+# Corrupt members listed in the report before it is cut short
+MAX_REPORTED_MEMBERS = 20
+
+
+@Client.on_message(filters.command("test") & filters.private)
+async def test_command(client: Client, message: Message):
+    """Handle /test command - check an archive without extracting it"""
+    user_id = message.from_user.id
+
+    # Check force subscription
+    is_subscribed, buttons = await check_force_subscription(client, user_id)
+    if not is_subscribed:
+        await message.reply_text(
+            "❌ **Access Denied!**\n\n"
+            "You must join the following channels to use this bot:",
+            reply_markup=buttons
+        )
+        return
+
+    replied_msg = message.reply_to_message
+    if not replied_msg or (not replied_msg.document and not replied_msg.text):
+        await message.reply_text(
+            "❌ **Invalid Usage!**\n\n"
+            "Reply to an archive or Telegram file link with:\n"
+            "• `/test` - check the archive for corruption\n"
+            "• `/test \"password\"` - for password-protected files\n\n"
+            "Nothing is extracted or uploaded, you only get a report."
+        )
+        return
+
+    passwords = parse_passwords(message.text)
+
+    if replied_msg.text and 't.me/' in replied_msg.text:
+        await handle_telegram_link(client, message, replied_msg.text, passwords, handler=handle_file_test)
+        return
+
+    if replied_msg.document:
+        await handle_file_test(client, message, replied_msg, passwords)
+        return
+
+    await message.reply_text("❌ No valid file or link found in the replied message!")
+
+
+def format_test_report(file_name, report):
+    """Build the integrity report message"""
+    corrupt = report['corrupt']
+    status = "✅ **Archive is Intact**" if not corrupt else "❌ **Archive is Damaged**"
+
+    text = (
+        f"{status}\n\n"
+        f"**Archive:** `{file_name}`\n"
+        f"**Members OK:** {report['members']}\n"
+        f"**Data Verified:** {format_size(report['bytes'])}\n"
+    )
+    if corrupt:
+        text += f"**Corrupt:** {len(corrupt)}\n"
+    if report['unchecked']:
+        text += f"**Not Checked:** {report['unchecked']}\n"
+
+    if corrupt:
+        text += "\n**Corrupt Members:**\n"
+        for name, reason in corrupt[:MAX_REPORTED_MEMBERS]:
+            text += f"• `{name}` - {reason[:100]}\n"
+        if len(corrupt) > MAX_REPORTED_MEMBERS:
+            text += f"...and {len(corrupt) - MAX_REPORTED_MEMBERS} more\n"
+
+    return text
+
+
+async def handle_file_test(client: Client, message: Message, file_message: Message, passwords: list):
+    """Download an archive and verify every member's checksum"""
+    user_id = message.from_user.id
+
+    file = file_message.document
+    file_name = file.file_name
+    file_size = file.file_size
+
+    ext = file_name.lower().rsplit('.', 1)[-1] if '.' in file_name else ''
+    supported_exts = ['zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz', 'tgz', 'tbz2', 'txz']
+
+    if ext not in supported_exts:
+        await message.reply_text(
+            f"❌ **Unsupported File Type!**\n\n"
+            f"File: `{file_name}`\n"
+            f"Extension: `.{ext}`\n\n"
+            f"Please send only compressed files:\n"
+            f".zip, .rar, .7z, .tar, .gz, .bz2, .xz"
+        )
+        return
+
+    # Testing doesn't use the daily quota, but the size limit still applies
+    can_proceed, size_msg = check_file_size(user_id, file_size)
+    if not can_proceed:
+        await message.reply_text(size_msg)
+        return
+
+    start_process(user_id, 'test', filename=file_name)
+
+    status_msg = await message.reply_text(
+        f"**🧪 Testing Archive**\n\n"
+        f"**File:** `{file_name}`\n"
+        f"**Size:** {format_size(file_size)}\n\n"
+        f"⏳ Starting download...\n\n"
+        f"Use /cancel to stop"
+    )
+
+    file_path = None
+    settings = get_user_settings(user_id)
+
+    try:
+        start_time = time.time()
+
+        async def progress_wrapper(current, total):
+            await progress_callback(current, total, status_msg, start_time, user_id, "Downloading")
+
+        # Truncated or mislabeled files are reported without downloading them
+        file_path, probe_error = await acquire_archive(
+            client, file_message, progress_wrapper,
+            check=lambda: probe_download(client, file_message, file_size, ext, file_name)
+        )
+        if probe_error:
+            await status_msg.edit_text(probe_error)
+            return
+
+        if not file_path:
+            await status_msg.edit_text("❌ Failed to download file!")
+            return
+
+        if is_cancelled(user_id):
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            return
+
+        await status_msg.edit_text("🔐 Checking archive...\n\nUse /cancel to stop")
+        password, error_msg = await resolve_password(
+            file_path, ext, passwords, keyring=get_keyring_passwords(settings)
+        )
+        if error_msg:
+            await status_msg.edit_text(error_msg)
+            return
+
+        # Members are decoded and discarded chunk by chunk, nothing hits disk
+        test_running = True
+        test_progress = {}
+        async def update_test_status():
+            elapsed = 0
+            while test_running:
+                await asyncio.sleep(5)
+                if test_running:
+                    elapsed += 5
+                    percent = test_progress.get('percent')
+                    done = f" {percent}%" if percent is not None else ""
+                    try:
+                        await status_msg.edit_text(
+                            f"🧪 Verifying checksums...{done} ({elapsed}s)\n\n"
+                            f"Use /cancel to stop"
+                        )
+                    except:
+                        pass
+
+        await status_msg.edit_text("🧪 Verifying checksums...\n\nUse /cancel to stop")
+        status_task = asyncio.create_task(update_test_status())
+        try:
+            report = await test_archive(file_path, password, ext, file_name, progress=test_progress)
+        finally:
+            test_running = False
+            status_task.cancel()
+            try:
+                await status_task
+            except asyncio.CancelledError:
+                pass
+
+        if is_cancelled(user_id):
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            return
+
+        await status_msg.edit_text(format_test_report(file_name, report))
+
+    except Exception as e:
+        if "cancelled" in str(e).lower():
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+        elif 'password' in str(e).lower():
+            await status_msg.edit_text(f"❌ Incorrect password or password required\n\nError: {str(e)}")
+        else:
+            await status_msg.edit_text(
+                f"❌ **Archive is Damaged**\n\n"
+                f"**Archive:** `{file_name}`\n"
+                f"The archive could not be read: {str(e)}"
+            )
+
+    finally:
+        end_process(user_id)
+
+        if file_path:
+            release_archive(file_path)
@@ -1,6 +1,11 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from database.user_settings_helper import get_user_settings, update_user_settings
+from utils.keyring import get_keyring_passwords, add_keyring_password
+from utils.member_filter import parse_patterns, parse_size_range
+from utils.thumbnails import get_thumbnail, release_thumbnail, invalidate_thumbnail
+from utils.helpers import format_size
+from config import MAX_KEYRING_PASSWORDS, BUNDLE_MEMBER_MAX_BYTES
 
 
 # Store user input states
@@ -40,6 +45,33 @@ def get_settings_status_text(settings):
     status += f"🔄 Replace Caption Words: {caption_replace_status}\n"
     status += f"🔄 Replace Filename Words: {filename_replace_status}\n"
     
+    # Nested archives
+    nested_status = "✅ On" if settings.get('extract_nested') else "❌ Off"
+    status += f"📦 Extract Nested Archives: {nested_status}\n"
+    
+    # Member filters
+    filter_count = (
+        len(parse_patterns(settings.get('include_patterns'))) +
+        len(parse_patterns(settings.get('exclude_patterns'))) +
+        (settings.get('min_member_size') is not None) +
+        (settings.get('max_member_size') is not None)
+    )
+    filter_status = f"✅ Set ({filter_count} rules)" if filter_count else "❌ Not Set"
+    status += f"🎯 File Filters: {filter_status}\n"
+    
+    # Small-file bundles
+    bundle_status = "✅ On" if settings.get('bundle_small_files') else "❌ Off"
+    status += f"🗜️ Bundle Small Files: {bundle_status}\n"
+    
+    # Checksum file
+    checksums_status = "✅ On" if settings.get('send_checksums') else "❌ Off"
+    status += f"🧾 Send Checksum File: {checksums_status}\n"
+    
+    # Password keyring
+    saved_passwords = len(get_keyring_passwords(settings))
+    keyring_status = f"✅ {saved_passwords} saved" if saved_passwords else "❌ Empty"
+    status += f"🔑 Password Keyring: {keyring_status}\n"
+    
     status += "\n**Click a button below to configure:**"
     return status
 
@@ -56,7 +88,16 @@ def get_main_menu_keyboard():
             InlineKeyboardButton("📝 Prefix/Suffix", callback_data="settings_prefix_suffix")
         ],
         [
-            InlineKeyboardButton("🔄 Replace Words", callback_data="settings_replace_words")
+            InlineKeyboardButton("🔄 Replace Words", callback_data="settings_replace_words"),
+            InlineKeyboardButton("📦 Nested Archives", callback_data="settings_nested_toggle")
+        ],
+        [
+            InlineKeyboardButton("🔑 Password Keyring", callback_data="settings_keyring"),
+            InlineKeyboardButton("🧾 Checksum File", callback_data="settings_checksums_toggle")
+        ],
+        [
+            InlineKeyboardButton("🎯 File Filters", callback_data="settings_filters"),
+            InlineKeyboardButton("🗜️ Bundle Small Files", callback_data="settings_bundle_toggle")
         ],
         [
             InlineKeyboardButton("🔙 Close", callback_data="settings_close")
@@ -130,6 +171,114 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         )
         await callback_query.answer("✅ Upload type set to Media")
     
+    elif data == "settings_nested_toggle":
+        enabled = not settings.get('extract_nested', False)
+        update_user_settings(user_id, {"extract_nested": enabled})
+        settings = get_user_settings(user_id)
+        await callback_query.message.edit_text(
+            get_settings_status_text(settings),
+            reply_markup=get_main_menu_keyboard()
+        )
+        await callback_query.answer(
+            "✅ Archives inside archives will be extracted too" if enabled
+            else "✅ Archives inside archives will be sent as files"
+        )
+    
+    elif data == "settings_bundle_toggle":
+        enabled = not settings.get('bundle_small_files', False)
+        update_user_settings(user_id, {"bundle_small_files": enabled})
+        settings = get_user_settings(user_id)
+        await callback_query.message.edit_text(
+            get_settings_status_text(settings),
+            reply_markup=get_main_menu_keyboard()
+        )
+        await callback_query.answer(
+            f"✅ Files under {format_size(BUNDLE_MEMBER_MAX_BYTES)} will be sent in zip bundles" if enabled
+            else "✅ Every file will be sent on its own"
+        )
+    
+    elif data == "settings_checksums_toggle":
+        enabled = not settings.get('send_checksums', False)
+        update_user_settings(user_id, {"send_checksums": enabled})
+        settings = get_user_settings(user_id)
+        await callback_query.message.edit_text(
+            get_settings_status_text(settings),
+            reply_markup=get_main_menu_keyboard()
+        )
+        await callback_query.answer(
+            "✅ A SHA-256 checksum file will be sent after each extraction" if enabled
+            else "✅ Checksum file turned off"
+        )
+    
+    elif data == "settings_filters":
+        await show_filters_menu(callback_query, settings)
+    
+    elif data == "settings_filter_include_set":
+        user_input_states[user_id] = {"waiting_for": "include_patterns"}
+        await callback_query.message.edit_text(
+            "🎯 **Only Extract Matching Files**\n\n"
+            "Send comma-separated patterns. Only files matching one of them are extracted.\n\n"
+            "**Example:** `*.mp4, *.mkv`\n"
+            "**Example:** `Season 1/*`\n\n"
+            "Send /cancel to abort."
+        )
+        await callback_query.answer()
+    
+    elif data == "settings_filter_exclude_set":
+        user_input_states[user_id] = {"waiting_for": "exclude_patterns"}
+        await callback_query.message.edit_text(
+            "🎯 **Skip Matching Files**\n\n"
+            "Send comma-separated patterns. Matching files are never extracted.\n"
+            "End a pattern with `/` to skip a whole folder.\n\n"
+            "**Example:** `*.txt, *.nfo, __MACOSX/`\n\n"
+            "Send /cancel to abort."
+        )
+        await callback_query.answer()
+    
+    elif data == "settings_filter_size_set":
+        user_input_states[user_id] = {"waiting_for": "member_size_range"}
+        await callback_query.message.edit_text(
+            "🎯 **File Size Range**\n\n"
+            "Send the allowed size range of extracted files.\n\n"
+            "**Example:** `10MB-2GB` - between 10 MB and 2 GB\n"
+            "**Example:** `10MB-` - over 10 MB\n"
+            "**Example:** `-500KB` - under 500 KB\n\n"
+            "Send /cancel to abort."
+        )
+        await callback_query.answer()
+    
+    elif data == "settings_filters_clear":
+        update_user_settings(user_id, {
+            "include_patterns": "",
+            "exclude_patterns": "",
+            "min_member_size": None,
+            "max_member_size": None
+        })
+        settings = get_user_settings(user_id)
+        await show_filters_menu(callback_query, settings)
+        await callback_query.answer("✅ Filters cleared")
+    
+    elif data == "settings_keyring":
+        await show_keyring_menu(callback_query, settings)
+    
+    elif data == "settings_keyring_add":
+        user_input_states[user_id] = {"waiting_for": "keyring_password"}
+        await callback_query.message.edit_text(
+            "🔑 **Add Password to Keyring**\n\n"
+            "Send me a password you often use for archives.\n"
+            "Your message will be deleted right after saving.\n\n"
+            "When you use `/unzip` without a password on a protected archive, "
+            "saved passwords are tried automatically.\n\n"
+            "Send /cancel to abort."
+        )
+        await callback_query.answer()
+    
+    elif data == "settings_keyring_clear":
+        update_user_settings(user_id, {"password_keyring": None})
+        settings = get_user_settings(user_id)
+        await show_keyring_menu(callback_query, settings)
+        await callback_query.answer("✅ Keyring cleared")
+    
     elif data == "settings_caption":
         await show_caption_menu(callback_query, settings)
     
@@ -173,6 +322,7 @@ async def settings_callback_handler(client: Client, callback_query: CallbackQuer
         await callback_query.answer()
     
     elif data == "settings_thumbnail_remove":
+        invalidate_thumbnail(settings.get('thumbnail'))
         update_user_settings(user_id, {"thumbnail": None})
         settings = get_user_settings(user_id)
         await callback_query.message.edit_text(
@@ -379,6 +529,63 @@ async def show_prefix_suffix_menu(callback_query, settings):
     await callback_query.answer()
 
 
+async def show_filters_menu(callback_query, settings):
+    """Show file filter configuration menu"""
+    include = settings.get('include_patterns') or 'Everything'
+    exclude = settings.get('exclude_patterns') or 'Nothing'
+    min_size = settings.get('min_member_size')
+    max_size = settings.get('max_member_size')
+    
+    if min_size is None and max_size is None:
+        size_range = 'Any size'
+    else:
+        size_range = f"{format_size(min_size) if min_size is not None else '0'} - {format_size(max_size) if max_size is not None else 'no limit'}"
+    
+    buttons = [
+        [
+            InlineKeyboardButton("✅ Only Extract", callback_data="settings_filter_include_set"),
+            InlineKeyboardButton("🚫 Skip", callback_data="settings_filter_exclude_set")
+        ],
+        [InlineKeyboardButton("📏 Size Range", callback_data="settings_filter_size_set")]
+    ]
+    
+    if settings.get('include_patterns') or settings.get('exclude_patterns') or min_size is not None or max_size is not None:
+        buttons.append([InlineKeyboardButton("❌ Clear Filters", callback_data="settings_filters_clear")])
+    
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data="settings_main")])
+    
+    await callback_query.message.edit_text(
+        f"🎯 **File Filters**\n\n"
+        f"**Only Extract:** `{include}`\n"
+        f"**Skip:** `{exclude}`\n"
+        f"**Size Range:** {size_range}\n\n"
+        f"Filtered files are skipped before decompression, so jobs finish faster.",
+        reply_markup=InlineKeyboardMarkup(buttons)
+    )
+    await callback_query.answer()
+
+
+async def show_keyring_menu(callback_query, settings):
+    """Show password keyring menu"""
+    saved_passwords = len(get_keyring_passwords(settings))
+    
+    buttons = [[InlineKeyboardButton("➕ Add Password", callback_data="settings_keyring_add")]]
+    
+    if saved_passwords:
+        buttons.append([InlineKeyboardButton("❌ Clear Keyring", callback_data="settings_keyring_clear")])
+    
+    buttons.append([InlineKeyboardButton("🔙 Back", callback_data="settings_main")])
+    
+    await callback_query.message.edit_text(
+        f"🔑 **Password Keyring**\n\n"
+        f"**Saved:** {saved_passwords} / {MAX_KEYRING_PASSWORDS} passwords\n\n"
+        f"Passwords are stored encrypted and tried automatically when an "
+        f"archive is protected and you didn't give a password.",
+        reply_markup=InlineKeyboardMarkup(buttons)
+    )
+    await callback_query.answer()
+
+
 async def show_replace_words_menu(callback_query, settings):
     """Show word replacement main menu"""
     keyboard = InlineKeyboardMarkup([
@@ -437,7 +644,7 @@ async def show_filename_replace_menu(callback_query, settings):
     await callback_query.answer()
 
 
-@Client.on_message(filters.private & filters.text & ~filters.command(["settings", "cancel", "start", "help", "unzip", "myplan", "premium", "redeem"]), group=10)
+@Client.on_message(filters.private & filters.text & ~filters.command(["settings", "cancel", "start", "help", "unzip", "test", "convert", "zip", "myplan", "premium", "redeem"]), group=10)
 async def handle_user_input(client: Client, message: Message):
     """Handle user text input for settings configuration"""
     user_id = message.from_user.id
@@ -454,12 +661,13 @@ async def handle_user_input(client: Client, message: Message):
         caption = message.text or message.caption
         entities = message.entities or message.caption_entities or []
         
-        # Convert entities to dict format for storage
+        # Convert entities to dict format for storage (offsets are in UTF-16 units)
         entities_dict = [
             {
-                "type": entity.type,
+                "type": entity.type.name.lower(),
                 "offset": entity.offset,
-                "length": entity.length
+                "length": entity.length,
+                **{key: getattr(entity, key) for key in ("url", "language", "custom_emoji_id") if getattr(entity, key)}
             }
             for entity in entities
         ] if entities else None
@@ -477,6 +685,64 @@ async def handle_user_input(client: Client, message: Message):
             reply_markup=get_main_menu_keyboard()
         )
     
+    elif waiting_for == "keyring_password":
+        password = message.text.strip()
+        update_user_settings(user_id, {"password_keyring": add_keyring_password(get_user_settings(user_id), password)})
+        del user_input_states[user_id]
+        
+        # Don't leave the password in the chat history
+        try:
+            await message.delete()
+        except Exception:
+            pass
+        
+        await message.reply_text("✅ Password saved to your keyring.")
+        
+        settings = get_user_settings(user_id)
+        await message.reply_text(
+            get_settings_status_text(settings),
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    elif waiting_for in ["include_patterns", "exclude_patterns"]:
+        patterns = ', '.join(parse_patterns(message.text))
+        update_user_settings(user_id, {waiting_for: patterns})
+        del user_input_states[user_id]
+        
+        label = "Only extracting" if waiting_for == "include_patterns" else "Skipping"
+        await message.reply_text(f"✅ {label}: `{patterns or 'nothing'}`")
+        
+        settings = get_user_settings(user_id)
+        await message.reply_text(
+            get_settings_status_text(settings),
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    elif waiting_for == "member_size_range":
+        try:
+            min_size, max_size = parse_size_range(message.text)
+        except ValueError:
+            await message.reply_text(
+                "❌ Invalid size range!\n\n"
+                "Use a format like `10MB-2GB`, `10MB-` or `-500KB`."
+            )
+            return
+        
+        if min_size is not None and max_size is not None and min_size > max_size:
+            await message.reply_text("❌ The minimum size is larger than the maximum size!")
+            return
+        
+        update_user_settings(user_id, {"min_member_size": min_size, "max_member_size": max_size})
+        del user_input_states[user_id]
+        
+        await message.reply_text("✅ File size range saved.")
+        
+        settings = get_user_settings(user_id)
+        await message.reply_text(
+            get_settings_status_text(settings),
+            reply_markup=get_main_menu_keyboard()
+        )
+    
     elif waiting_for == "prefix":
         prefix = message.text.strip()
         update_user_settings(user_id, {"filename_prefix": prefix})
@@ -530,7 +796,7 @@ async def handle_user_input(client: Client, message: Message):
         )
 
 
-@Client.on_message(filters.private & (filters.photo | filters.document) & ~filters.command(["settings", "cancel", "start", "help", "unzip"]), group=10)
+@Client.on_message(filters.private & (filters.photo | filters.document) & ~filters.command(["settings", "cancel", "start", "help", "unzip", "test", "convert", "zip"]), group=10)
 async def handle_photo_input(client: Client, message: Message):
     """Handle photo/document input for thumbnail"""
     user_id = message.from_user.id
@@ -557,10 +823,14 @@ async def handle_photo_input(client: Client, message: Message):
         await message.reply_text("❌ Please send a photo or image file.")
         return
     
-    # Save thumbnail
+    # Save thumbnail and drop the old one from the cache
+    invalidate_thumbnail(get_user_settings(user_id).get('thumbnail'))
     update_user_settings(user_id, {"thumbnail": file_id})
     del user_input_states[user_id]
     
+    # Prepare the 320px JPEG now so the first upload doesn't wait for it
+    release_thumbnail(await get_thumbnail(client, file_id))
+    
     await message.reply_text("✅ Thumbnail saved successfully!")
     
     settings = get_user_settings(user_id)
@@ -1,14 +1,33 @@
 from pyrogram import Client, filters
-from pyrogram.types import Message
+from pyrogram.enums import MessageEntityType
+from pyrogram.types import Message, MessageEntity, InputMediaPhoto, InputMediaVideo
 from plugins.force_sub import check_force_subscription
 from plugins.cancel import start_process, end_process, is_cancelled
 from utils.quota_manager import check_user_quota, check_file_size, increment_user_quota
-from utils.file_handler import download_file, extract_archive, get_all_files, cleanup_files, validate_file_type
+from utils.file_handler import extract_archive, cleanup_files, validate_file_type
+from utils.archive_cache import acquire_archive, release_archive
+from utils.manifest import checksum_file_text
+from utils.member_filter import build_member_filter
+from utils.probe import probe_download
+from utils.bundler import plan_bundles, iter_bundles
+from utils.splitter import split_sections, FileSection
+from utils.filename_transformer import plan_upload_names, compile_caption_template, render_caption
+from utils.media_probe import route_media_files, downscale_image, document_route
+from utils.mp4 import faststart_segments, SegmentStream
+from utils.thumbnails import get_thumbnail, release_thumbnail, AutoThumbnails
+from utils.job_registry import join_job, wait_job, claim_job, leave_job
+from contextlib import aclosing
 from utils.helpers import format_size, format_duration, progress_bar
+from utils.worker_pool import run_in_pool
+from utils.password_check import archive_is_encrypted, find_password
+from utils.keyring import get_keyring_passwords
 from database.database import bot_config_collection
+from config import UPLOAD_LIMIT_BYTES, MEDIA_GROUP_LIMIT
 import time
 import re
 import os
+import io
+import random
 import asyncio
 
 
@@ -67,6 +86,27 @@ async def progress_callback(current, total, message, start_time, user_id, action
         pass
 
 
+def parse_passwords(command_text: str):
+    """
+    Get candidate passwords from a command like /unzip "pass1" "pass2"
+    
+    Returns: list of passwords (empty if none were given)
+    """
+    command_text = command_text.split(maxsplit=1)
+    if len(command_text) < 2:
+        return []
+    
+    password_input = command_text[1].strip()
+    
+    # Try to extract from quotes first: /unzip "pass1" "pass2"
+    quoted = re.findall(r'"(.*?)"|\'(.*?)\'', password_input)
+    if quoted:
+        return [double or single for double, single in quoted]
+    
+    # Use the text as-is if no quotes
+    return [password_input]
+
+
 @Client.on_message(filters.command("unzip") & filters.private)
 async def unzip_command(client: Client, message: Message):
     """Handle /unzip command"""
@@ -88,25 +128,15 @@ async def unzip_command(client: Client, message: Message):
             "❌ **Invalid Usage!**\n\n"
             "Please reply to a file or Telegram link with:\n"
             "• `/unzip` - for files without password\n"
-            "• `/unzip \"password\"` - for password-protected files"
+            "• `/unzip \"password\"` - for password-protected files\n"
+            "• `/unzip \"pass1\" \"pass2\"` - try several passwords"
         )
         return
     
     replied_msg = message.reply_to_message
     
-    # Extract password from command - improved parsing
-    password = None
-    command_text = message.text.split(maxsplit=1)
-    if len(command_text) > 1:
-        password_input = command_text[1].strip()
-        
-        # Try to extract from quotes first
-        match = re.search(r'["\'](.*?)["\']', password_input)
-        if match:
-            password = match.group(1)
-        else:
-            # Use the text as-is if no quotes
-            password = password_input
+    # Extract candidate passwords from command
+    passwords = parse_passwords(message.text)
     
     # Check if replied message has a file
     if not replied_msg.document and not replied_msg.text:
@@ -115,19 +145,19 @@ async def unzip_command(client: Client, message: Message):
     
     # Handle Telegram link
     if replied_msg.text and 't.me/' in replied_msg.text:
-        await handle_telegram_link(client, message, replied_msg.text, password)
+        await handle_telegram_link(client, message, replied_msg.text, passwords)
         return
     
     # Handle direct file
     if replied_msg.document:
-        await handle_file_extraction(client, message, replied_msg, password)
+        await handle_file_extraction(client, message, replied_msg, passwords)
         return
     
     await message.reply_text("❌ No valid file or link found in the replied message!")
 
 
-async def handle_telegram_link(client: Client, message: Message, link_text: str, password: str):
-    """Handle file extraction from Telegram link"""
+async def handle_telegram_link(client: Client, message: Message, link_text: str, passwords: list, handler=None):
+    """Handle file extraction (or another file handler) from Telegram link"""
     # Parse Telegram link (t.me/channel/message_id or t.me/c/channel_id/message_id)
     try:
         # Extract URL from text (in case there's extra text)
@@ -200,7 +230,7 @@ async def handle_telegram_link(client: Client, message: Message, link_text: str,
             return
         
         # Process the file
-        await handle_file_extraction(client, message, file_msg, password)
+        await (handler or handle_file_extraction)(client, message, file_msg, passwords)
     
     except Exception as e:
         await message.reply_text(
@@ -213,7 +243,47 @@ async def handle_telegram_link(client: Client, message: Message, link_text: str,
         )
 
 
-async def handle_file_extraction(client: Client, message: Message, file_message: Message, password: str):
+async def resolve_password(file_path: str, ext: str, passwords: list, keyring: list = None):
+    """
+    Pick the archive password before any bulk decompression
+    
+    Saved keyring passwords are tried when the user gave none.
+    
+    Returns: (password, error_msg) - error_msg is set when the job can't succeed
+    """
+    password = passwords[0] if passwords else None
+    
+    if ext not in ['zip', 'rar', '7z']:
+        return password, None
+    
+    if not await run_in_pool(archive_is_encrypted, file_path, ext):
+        return password, None
+    
+    if not passwords:
+        # Only a verified keyring match is used, never a blind guess
+        if keyring:
+            password, verified = await find_password(file_path, ext, keyring)
+            if password is not None and verified:
+                return password, None
+        
+        return None, (
+            "🔐 **Password Required**\n\n"
+            "This archive is password protected.\n"
+            "Reply to the file with `/unzip \"password\"`\n"
+            "or try several: `/unzip \"pass1\" \"pass2\"`\n\n"
+            "💡 Save passwords you reuse in /settings → 🔑 Password Keyring"
+        )
+    
+    # Each candidate is tested against the header or smallest encrypted member
+    password, _ = await find_password(file_path, ext, passwords)
+    if password is None:
+        tried = "password" if len(passwords) == 1 else f"all {len(passwords)} passwords"
+        return None, f"❌ **Incorrect Password**\n\nChecked {tried} - none of them opens this archive."
+    
+    return password, None
+
+
+async def handle_file_extraction(client: Client, message: Message, file_message: Message, passwords: list):
     """Handle file extraction process"""
     user_id = message.from_user.id
     
@@ -224,7 +294,7 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
     
     # Validate file type - check extension
     ext = file_name.lower().rsplit('.', 1)[-1] if '.' in file_name else ''
-    supported_exts = ['zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'tgz', 'tbz2']
+    supported_exts = ['zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz', 'tgz', 'tbz2', 'txz']
     
     if ext not in supported_exts:
         await message.reply_text(
@@ -232,7 +302,7 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
             f"File: `{file_name}`\n"
             f"Extension: `.{ext}`\n\n"
             f"Please send only compressed files:\n"
-            f".zip, .rar, .7z, .tar, .gz, .bz2"
+            f".zip, .rar, .7z, .tar, .gz, .bz2, .xz"
         )
         return
     
@@ -262,6 +332,14 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
     
     file_path = None
     extract_dir = None
+    extract_job = None
+    delivery_dir = None
+    thumb_path = None
+    auto_thumbs = None
+    
+    # Get user settings for extraction and file transformations
+    from database.user_settings_helper import get_user_settings
+    settings = get_user_settings(user_id)
     
     try:
         # Check for cancellation
@@ -276,11 +354,16 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
         async def progress_wrapper(current, total):
             await progress_callback(current, total, status_msg, start_time, user_id, "Downloading")
         
-        file_path, _, _ = await download_file(
-            client,
-            file_message,
-            progress_wrapper
+        # Cached archives are reused, and requests for the same file share
+        # one download with everyone following its progress. On a miss the
+        # first and last chunks are checked before committing to the download
+        file_path, probe_error = await acquire_archive(
+            client, file_message, progress_wrapper,
+            check=lambda: probe_download(client, file_message, file_size, ext, file_name)
         )
+        if probe_error:
+            await status_msg.edit_text(probe_error)
+            return
         
         if not file_path:
             await status_msg.edit_text("❌ Failed to download file!")
@@ -289,13 +372,49 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
         # Check for cancellation
         if is_cancelled(user_id):
             await status_msg.edit_text("⏸️ Process cancelled by user.")
-            await cleanup_files([file_path])
+            return
+        
+        # Verify password in milliseconds instead of failing after a full decode
+        await status_msg.edit_text("🔐 Checking archive...\n\nUse /cancel to stop")
+        password, error_msg = await resolve_password(
+            file_path, ext, passwords, keyring=get_keyring_passwords(settings)
+        )
+        if error_msg:
+            await status_msg.edit_text(error_msg)
             return
         
         # Extract archive
         try:
             await status_msg.edit_text("📂 Extracting archive...\n\nUse /cancel to stop")
             
+            # Requests with the same file, password and extraction settings
+            # share one extraction; each sends the output with its own settings
+            member_filter = build_member_filter(settings)
+            recursive = settings.get('extract_nested', False)
+            checksums = settings.get('send_checksums', False)
+            
+            async def start_extraction(job):
+                return await extract_archive(
+                    file_path,
+                    password,
+                    progress=job['progress'],
+                    cancel_check=lambda: job['refs'] == 0,
+                    recursive=recursive,
+                    file_name=file_name,
+                    checksums=checksums,
+                    member_filter=member_filter
+                )
+            
+            async def cleanup_extraction(result):
+                if result[1]:
+                    await cleanup_files([result[1]])
+            
+            extract_job = join_job(
+                ('extract', file.file_unique_id, password, recursive, checksums, repr(member_filter)),
+                start_extraction, cleanup_extraction
+            )
+            extraction_progress = extract_job['progress']
+            
             # Start a task to update status every 5 seconds during extraction
             extraction_running = True
             async def update_extraction_status():
@@ -304,9 +423,11 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
                     await asyncio.sleep(5)
                     if extraction_running:  # Check again after sleep
                         elapsed += 5
+                        percent = extraction_progress.get('percent')
+                        done = f" {percent}%" if percent is not None else ""
                         try:
                             await status_msg.edit_text(
-                                f"📂 Extracting archive... ({elapsed}s)\n\n"
+                                f"📂 Extracting archive...{done} ({elapsed}s)\n\n"
                                 f"Please wait, large files may take several minutes.\n\n"
                                 f"Use /cancel to stop"
                             )
@@ -317,7 +438,9 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
             status_task = asyncio.create_task(update_extraction_status())
             
             try:
-                success, extract_dir, error_msg = await extract_archive(file_path, password)
+                success, extract_dir, manifest, error_msg = await wait_job(
+                    extract_job, lambda: is_cancelled(user_id)
+                )
             finally:
                 extraction_running = False
                 await asyncio.sleep(0.1)  # Give status task time to see the flag
@@ -328,49 +451,44 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
                     pass
             
             if not success:
+                if is_cancelled(user_id):
+                    error_msg = "⏸️ Process cancelled by user."
                 await status_msg.edit_text(error_msg or "❌ Extraction failed!")
-                await cleanup_files([file_path])
                 return
         except Exception as e:
+            if "cancelled" in str(e).lower():
+                raise
             await status_msg.edit_text(f"❌ Extraction error: {str(e)}")
-            await cleanup_files([file_path])
             return
         
         # Check for cancellation
         if is_cancelled(user_id):
             await status_msg.edit_text("⏸️ Process cancelled by user.")
-            await cleanup_files([file_path, extract_dir])
-            return
-        
-        # Get extracted files
-        try:
-            await status_msg.edit_text("📋 Getting extracted files...\n\nUse /cancel to stop")
-            extracted_files = await get_all_files(extract_dir, max_files=50)
-        except Exception as e:
-            await status_msg.edit_text(f"❌ Error reading extracted files: {str(e)}")
-            await cleanup_files([file_path, extract_dir])
             return
         
-        if not extracted_files:
+        # Output nobody else uses is freed file by file as it is sent. Shared
+        # output stays intact until its last user is done, and everything this
+        # delivery writes (bundles, thumbnails, downscaled photos) goes to a
+        # folder of its own
+        exclusive = claim_job(extract_job)
+        delivery_dir = os.path.join(extract_dir, f".delivery_{user_id}_{random.randint(100000, 999999)}")
+        os.makedirs(delivery_dir, exist_ok=True)
+        
+        # The manifest was built while extracting, no need to walk the tree again.
+        # In bundle mode small files go out as a few zips instead of one message each
+        bundles = []
+        singles = manifest
+        if settings.get('bundle_small_files', False):
+            bundles, singles = plan_bundles(manifest)
+        extracted_files = singles[:50]
+        
+        if not extracted_files and not bundles:
             await status_msg.edit_text("❌ No files found in archive!")
-            await cleanup_files([file_path, extract_dir])
             return
         
         # Send files
-        total_files = len(extracted_files)
-        await status_msg.edit_text(
-            f"📤 **Uploading Files**\n\n"
-            f"{'░' * 20} 0%\n"
-            f"**Files:** 0 / {total_files} uploaded\n\n"
-            f"Use /cancel to stop"
-        )
-        
-        #Get user settings for file transformations
-        from database.user_settings_helper import get_user_settings
-        from utils.filename_transformer import transform_filename, substitute_caption_variables, apply_replacements, get_file_type
-        from pyrogram.types import MessageEntity
-        
-        settings = get_user_settings(user_id)
+        total_files = len(bundles) + len(extracted_files)
+        await status_msg.edit_text(upload_status_text(0, total_files))
         
         # Get log channel
         log_channel_id = await get_log_channel()
@@ -382,153 +500,156 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
             except Exception:
                 log_channel_id = None  # Disable logging if channel is inaccessible
         
+        # Custom thumbnail: downloaded once, then served from the cache
+        thumb_path = await get_thumbnail(client, settings.get('thumbnail'))
+        
+        # Without a custom thumbnail, images sent as documents get their own
+        # preview, made in the pool while earlier files upload
+        if not thumb_path and settings.get('upload_as_document', True):
+            auto_thumbs = AutoThumbnails(extracted_files, os.path.join(delivery_dir, 'thumbs'))
+        
         sent_count = 0
-        for idx, file in enumerate(extracted_files, 1):
-            # Check for cancellation before each file
+        bundled_count = 0
+        
+        # Each bundle is zipped in a worker while the previous one uploads
+        archive_stem = os.path.splitext(file_name)[0]
+        async with aclosing(iter_bundles(bundles, extract_dir, delivery_dir, remove_sources=exclusive)) as bundle_iter:
+            async for index, bundle_path, entries in bundle_iter:
+                if is_cancelled(user_id):
+                    await status_msg.edit_text(
+                        f"⏸️ **Process Cancelled**\n\n"
+                        f"Sent {sent_count}/{total_files} files before cancellation."
+                    )
+                    return
+                
+                try:
+                    sent_msg = await client.send_document(
+                        chat_id=user_id,
+                        document=bundle_path,
+                        file_name=f"{archive_stem} (bundle {index + 1} of {len(bundles)}).zip",
+                        caption=f"🗜️ **Bundle {index + 1}/{len(bundles)}** - {len(entries)} small files",
+                        thumb=thumb_path
+                    )
+                    sent_count += 1
+                    bundled_count += len(entries)
+                    await status_msg.edit_text(upload_status_text(sent_count, total_files))
+                    
+                    if log_channel_id and sent_msg:
+                        try:
+                            await sent_msg.copy(log_channel_id)
+                        except Exception:
+                            pass
+                    
+                    os.remove(bundle_path)
+                except Exception as e:
+                    await message.reply_text(f"⚠️ Could not send bundle {index + 1}: {str(e)}")
+        
+        # Upload names for every file, planned once; nothing is renamed on disk
+        upload_names = plan_upload_names([entry['path'] for entry in extracted_files], settings)
+        
+        # In media mode every file is routed by its headers before any upload,
+        # and consecutive photos/videos go out as albums of up to 10
+        routes = None
+        if not settings.get('upload_as_document', True):
+            routes = await run_in_pool(route_media_files, [
+                (entry['path'], upload_names[entry['path']]) for entry in extracted_files
+            ])
+        
+        # The caption template is compiled once for the whole job
+        caption_template = compile_caption_template(
+            settings.get('custom_caption'), settings.get('caption_entities'), settings.get('caption_replacements')
+        )
+        
+        position = 0
+        for batch in plan_upload_batches(extracted_files, settings, routes):
+            # Check for cancellation before each file or album
             if is_cancelled(user_id):
                 await status_msg.edit_text(
                     f"⏸️ **Process Cancelled**\n\n"
                     f"Sent {sent_count}/{total_files} files before cancellation."
                 )
-                await cleanup_files([file_path, extract_dir])
                 return
             
-            try:
-                # Get original filename
-                original_name = os.path.basename(file)
-                
-                # Transform filename according to user settings
-                new_name = transform_filename(original_name, settings)
-                
-                # Rename file to new name
-                new_path = os.path.join(os.path.dirname(file), new_name)
-                if file != new_path:
-                    os.rename(file, new_path)
-                    file = new_path
-                
-                # Prepare caption if user has set custom caption
-                caption = None
-                caption_entities = None
+            prepared = []
+            for idx, (entry, route) in enumerate(batch, position + 1):
+                if auto_thumbs:
+                    route['thumb'] = await auto_thumbs.get(entry['path'])
+                try:
+                    prepared.append((idx, entry, route) + prepare_upload(entry, upload_names[entry['path']], caption_template))
+                except Exception as e:
+                    await message.reply_text(f"⚠️ Could not send file {idx}: {str(e)}")
+                    continue
                 
-                if settings.get('custom_caption'):
-                    # Get file size and extension
-                    file_size_bytes = os.path.getsize(file)
-                    file_ext = os.path.splitext(new_name)[1][1:] if '.' in new_name else ''
+                # Oversized photos are shrunk in a worker instead of failing after
+                # upload, into a .jpg of their own so the original keeps its format
+                if route['downscale']:
+                    try:
+                        source = prepared[-1][3]
+                        target = os.path.join(delivery_dir, f"{idx}.jpg")
+                        await run_in_pool(downscale_image, source, target)
+                        prepared[-1] = prepared[-1][:3] + (target,) + prepared[-1][4:]
+                    except Exception as e:
+                        print(f"Could not downscale {entry['path']}, sending as document: {e}")
+                        route['type'] = 'document'
+            position += len(batch)
+            
+            if len(prepared) > 1 and all(item[2]['type'] != 'document' for item in prepared):
+                try:
+                    await send_album(client, user_id, prepared, thumb_path, log_channel_id)
+                    sent_count += len(prepared)
+                    await status_msg.edit_text(upload_status_text(sent_count, total_files))
+                    if exclusive:
+                        await remove_sent_files(prepared)
+                    continue
+                except Exception as e:
+                    # One bad item fails the whole album - fall back to single sends
+                    print(f"Album upload failed, sending files one by one: {e}")
+            
+            for item in prepared:
+                idx, entry, route, file, new_name, caption, caption_entities = item
+                try:
+                    await send_member(
+                        client, user_id, file, entry['size'], new_name, caption, caption_entities,
+                        route, settings, thumb_path, log_channel_id
+                    )
                     
-                    # Prepare file info for variable substitution
-                    file_info = {
-                        'filename': new_name,
-                        'size': format_size(file_size_bytes),
-                        'extension': file_ext,
-                        'caption': ''  # Original caption if any
-                    }
+                    # Only count as sent after successful delivery to user
+                    sent_count += 1
                     
-                    # Substitute variables in caption template
-                    caption = substitute_caption_variables(settings['custom_caption'], file_info)
+                    # Update progress bar
+                    await status_msg.edit_text(upload_status_text(sent_count, total_files))
                     
-                    # Apply caption word replacements
-                    if settings.get('caption_replacements'):
-                        caption = apply_replacements(caption, settings['caption_replacements'])
+                    # Delete file only after BOTH sends complete successfully
+                    if exclusive:
+                        await remove_sent_files([item])
                     
-                    # Restore formatting entities if they exist
-                    if settings.get('caption_entities'):
-                        caption_entities = [
-                            MessageEntity(
-                                type=e['type'],
-                                offset=e['offset'],
-                                length=e['length']
-                            )
-                            for e in settings['caption_entities']
-                        ]
-                
-                # Send file according to upload type setting
-                sent_msg = None
-                
-                # Get thumbnail and validate it exists
-                thumb_path = settings.get('thumbnail')
-                if thumb_path and not os.path.isfile(thumb_path):
-                    thumb_path = None  # Reset if file doesn't exist
-                
-                if settings.get('upload_as_document', True):
-                    # Send as document
-                    sent_msg = await client.send_document(
-                        chat_id=user_id,
-                        document=file,
-                        caption=caption,
-                        caption_entities=caption_entities,
-                        thumb=thumb_path
-                    )
-                else:
-                    # Send as media (photo/video) based on file type
-                    file_type = get_file_type(new_name)
-                    
-                    if file_type == 'photo':
-                        sent_msg = await client.send_photo(
-                            chat_id=user_id,
-                            photo=file,
-                            caption=caption,
-                            caption_entities=caption_entities
-                        )
-                    elif file_type == 'video':
-                        sent_msg = await client.send_video(
-                            chat_id=user_id,
-                            video=file,
-                            caption=caption,
-                            caption_entities=caption_entities,
-                            thumb=thumb_path
-                        )
-                    else:
-                        # Fall back to document for unknown types
-                        sent_msg = await client.send_document(
-                            chat_id=user_id,
-                            document=file,
-                            caption=caption,
-                            caption_entities=caption_entities,
-                            thumb=thumb_path
-                        )
-                
-                # Only count as sent after successful delivery to user
-                sent_count += 1
-                
-                # Update progress bar
-                progress_percentage = (sent_count / total_files) * 100
-                filled = int(20 * sent_count / total_files)
-                bar = '█' * filled + '░' * (20 - filled)
-                
-                await status_msg.edit_text(
-                    f"📤 **Uploading Files**\n\n"
-                    f"{bar} {progress_percentage:.0f}%\n"
-                    f"**Files:** {sent_count} / {total_files} uploaded\n\n"
-                    f"Use /cancel to stop"
+                except Exception as e:
+                    await message.reply_text(f"⚠️ Could not send file {idx}: {str(e)}")
+
+        
+        # Checksums of everything in the archive, verifiable with sha256sum -c
+        if settings.get('send_checksums', False):
+            checksum_file = io.BytesIO(checksum_file_text(manifest, extract_dir).encode('utf-8'))
+            checksum_file.name = f"{file_name}.sha256"
+            try:
+                await client.send_document(
+                    chat_id=user_id,
+                    document=checksum_file,
+                    caption=f"🧾 Checksums for `{file_name}`"
                 )
-                
-                # Forward to log channel
-                if log_channel_id and sent_msg:
-                    try:
-                        await sent_msg.copy(log_channel_id)
-                    except Exception:
-                        pass  # Silently skip if log channel forward fails
-                
-                # Delete file only after BOTH sends complete successfully
-                try:
-                    await asyncio.sleep(0.2)  # Small delay to ensure upload complete
-                    if os.path.isfile(file):
-                        os.remove(file)
-                except Exception:
-                    pass  # Silently skip if file deletion fails
-                
             except Exception as e:
-                await message.reply_text(f"⚠️ Could not send file {idx}: {str(e)}")
-
+                await message.reply_text(f"⚠️ Could not send checksum file: {str(e)}")
         
         # Increment quota
         increment_user_quota(user_id, file_name, file_size)
         
         # Success message
+        bundled_line = f"**Bundled:** {bundled_count} small file(s) in {len(bundles)} zip(s)\n" if bundles else ""
         await status_msg.edit_text(
             f"✅ **Extraction Complete!**\n\n"
             f"**Archive:** `{file_name}`\n"
-            f"**Extracted:** {len(extracted_files)} file(s)\n\n"
+            f"**Extracted:** {len(extracted_files) + bundled_count} file(s)\n"
+            f"{bundled_line}\n"
             f"All files have been sent!"
         )
     
@@ -542,11 +663,293 @@ async def handle_file_extraction(client: Client, message: Message, file_message:
         # End process tracking
         end_process(user_id)
         
-        # Cleanup
+        if auto_thumbs:
+            await auto_thumbs.close()
+        release_thumbnail(thumb_path)
+        
+        # Cleanup: a shared extraction is removed by its last user, and the
+        # archive stays in the cache for retries
+        if delivery_dir:
+            await cleanup_files([delivery_dir])
+        if extract_job:
+            await leave_job(extract_job)
         if file_path:
-            await cleanup_files([file_path])
-        if extract_dir:
-            await cleanup_files([extract_dir])
+            release_archive(file_path)
+
+
+async def send_in_parts(client: Client, user_id: int, file: str, size: int, name: str, thumb_path, log_channel_id):
+    """
+    Upload a file bigger than the upload limit as raw byte-range parts
+    
+    Each part is read straight from the extracted file while it uploads,
+    so no part is ever written to disk.
+    """
+    parts = split_sections(file, size, name)
+    try:
+        for number, part in enumerate(parts, 1):
+            caption = f"📦 `{name}`\n**Part {number} of {len(parts)}**"
+            if number == len(parts):
+                caption += f"\n\nJoin with 7-Zip, or `cat {name}.0* > \"{name}\"`"
+            
+            await send_part(client, user_id, part, caption, thumb_path, log_channel_id)
+    finally:
+        for part in parts:
+            part.close()
+
+
+async def send_part(client: Client, user_id: int, part, caption: str, thumb_path, log_channel_id):
+    """Upload one FileSection part, copy it to the log channel and close it"""
+    try:
+        sent_msg = await client.send_document(
+            chat_id=user_id,
+            document=part,
+            caption=caption,
+            thumb=thumb_path
+        )
+    finally:
+        part.close()
+    
+    if log_channel_id and sent_msg:
+        try:
+            await sent_msg.copy(log_channel_id)
+        except Exception:
+            pass
+
+
+def plan_upload_batches(entries, settings, routes=None):
+    """
+    Group manifest entries into upload batches
+    
+    In media mode runs of consecutive photos/videos become albums of up to
+    MEDIA_GROUP_LIMIT items; everything else is a batch of one.
+    
+    Args:
+        entries (list): Manifest entries to send
+        settings (dict): User settings
+        routes (list or None): route_media() result for each entry, media mode only
+    
+    Returns:
+        list: Lists of (entry, route) pairs
+    """
+    if settings.get('upload_as_document', True) or routes is None:
+        return [[(entry, document_route())] for entry in entries]
+    
+    batches = []
+    album = []
+    for entry, route in zip(entries, routes):
+        if route['type'] in ('photo', 'video') and entry['size'] <= UPLOAD_LIMIT_BYTES:
+            if len(album) == MEDIA_GROUP_LIMIT:
+                batches.append(album)
+                album = []
+            album.append((entry, route))
+            continue
+        if album:
+            batches.append(album)
+            album = []
+        batches.append([(entry, route)])
+    if album:
+        batches.append(album)
+    return batches
+
+
+def prepare_upload(entry, new_name, caption_template=None):
+    """
+    Build the caption for an extracted file
+    
+    Args:
+        entry (dict): Manifest entry
+        new_name (str): Planned upload name from plan_upload_names()
+        caption_template (dict or None): The job's compile_caption_template() result
+    
+    Returns:
+        tuple: (file, new_name, caption, caption_entities)
+    """
+    file = entry['path']
+    
+    # Prepare caption if user has set custom caption
+    caption = None
+    caption_entities = None
+    
+    if caption_template:
+        # Get file size and extension
+        file_ext = os.path.splitext(new_name)[1][1:] if '.' in new_name else ''
+        
+        # Prepare file info for variable substitution
+        file_info = {
+            'filename': new_name,
+            'size': format_size(entry['size']),
+            'extension': file_ext,
+            'caption': ''  # Original caption if any
+        }
+        
+        # Variables and replacements in one join, with entities moved to match
+        caption, entities = render_caption(caption_template, file_info)
+        caption_entities = to_message_entities(entities)
+    
+    return file, new_name, caption, caption_entities
+
+
+def to_message_entities(entities):
+    """Build MessageEntity objects from stored entity dicts"""
+    message_entities = []
+    for entity in entities:
+        entity_type = entity['type']
+        if not isinstance(entity_type, MessageEntityType):
+            # Stored as a name ("bold") or as the enum's str() ("MessageEntityType.BOLD")
+            entity_type = MessageEntityType[str(entity_type).rsplit('.', 1)[-1].upper()]
+        message_entities.append(MessageEntity(
+            type=entity_type,
+            offset=entity['offset'],
+            length=entity['length'],
+            url=entity.get('url'),
+            language=entity.get('language'),
+            custom_emoji_id=entity.get('custom_emoji_id')
+        ))
+    return message_entities or None
+
+
+async def send_member(client: Client, user_id: int, file: str, size: int, new_name: str, caption, caption_entities,
+                      route: dict, settings: dict, thumb_path, log_channel_id):
+    """Send one extracted file according to the user's upload type setting and its media route"""
+    sent_msg = None
+    file_type = route['type']
+    thumb_path = route.get('thumb') or thumb_path
+    
+    if size > UPLOAD_LIMIT_BYTES:
+        # Too big for one upload: sent as raw .001, .002 ... parts
+        await send_in_parts(client, user_id, file, size, new_name, thumb_path, log_channel_id)
+    elif settings.get('upload_as_document', True):
+        # Send as document
+        sent_msg = await client.send_document(
+            chat_id=user_id,
+            document=file,
+            file_name=new_name,
+            caption=caption,
+            caption_entities=caption_entities,
+            thumb=thumb_path
+        )
+    else:
+        # Send as media (photo/video) based on the pre-flight route
+        if file_type == 'photo':
+            sent_msg = await client.send_photo(
+                chat_id=user_id,
+                photo=file,
+                caption=caption,
+                caption_entities=caption_entities
+            )
+        elif file_type == 'video':
+            video = await streamable_video(file, new_name, route)
+            try:
+                sent_msg = await client.send_video(
+                    chat_id=user_id,
+                    video=video,
+                    file_name=new_name,
+                    caption=caption,
+                    caption_entities=caption_entities,
+                    duration=route['duration'],
+                    width=route['width'],
+                    height=route['height'],
+                    supports_streaming=True,
+                    thumb=thumb_path
+                )
+            finally:
+                if video is not file:
+                    video.close()
+        else:
+            # Fall back to document for unknown types
+            sent_msg = await client.send_document(
+                chat_id=user_id,
+                document=file,
+                file_name=new_name,
+                caption=caption,
+                caption_entities=caption_entities,
+                thumb=thumb_path
+            )
+    
+    # Forward to log channel
+    if log_channel_id and sent_msg:
+        try:
+            await sent_msg.copy(log_channel_id)
+        except Exception:
+            pass  # Silently skip if log channel forward fails
+
+
+async def send_album(client: Client, user_id: int, prepared: list, thumb_path, log_channel_id):
+    """Send prepared photos/videos as one media group (one API call instead of one per file)"""
+    media = []
+    streams = []
+    try:
+        for _, entry, route, file, new_name, caption, caption_entities in prepared:
+            if route['type'] == 'photo':
+                media.append(InputMediaPhoto(file, caption=caption or '', caption_entities=caption_entities))
+            else:
+                video = await streamable_video(file, new_name, route)
+                if video is file:
+                    # Album videos take their name from the stream, so wrap the file under its upload name
+                    video = FileSection(file, 0, entry['size'], new_name)
+                streams.append(video)
+                media.append(InputMediaVideo(
+                    video, thumb=thumb_path, caption=caption or '', caption_entities=caption_entities,
+                    width=route['width'], height=route['height'], duration=route['duration'],
+                    supports_streaming=True
+                ))
+        
+        sent_msgs = await client.send_media_group(chat_id=user_id, media=media)
+    finally:
+        for stream in streams:
+            stream.close()
+    
+    # The whole album is copied to the log channel in one call too
+    if log_channel_id and sent_msgs:
+        try:
+            await client.copy_media_group(log_channel_id, user_id, sent_msgs[0].id)
+        except Exception:
+            pass
+
+
+async def streamable_video(file: str, new_name: str, route: dict):
+    """
+    The video to upload: the file itself, or a faststart view of it
+    
+    When moov sits after the media data the upload reads moov first, straight
+    from the extracted file, so playback can start before the download ends.
+    """
+    if not route.get('faststart'):
+        return file
+    try:
+        segments = await run_in_pool(faststart_segments, file)
+    except Exception as e:
+        print(f"Could not plan faststart for {file}: {e}")
+        return file
+    return SegmentStream(file, segments, new_name) if segments else file
+
+
+async def remove_sent_files(prepared):
+    """Delete uploaded files so the disk frees up while the rest is sent"""
+    await asyncio.sleep(0.2)  # Small delay to ensure upload complete
+    for item in prepared:
+        # A downscaled photo was sent from a temporary copy; the oversized
+        # original is done with as well
+        for path in (item[3], item[1]['path']):
+            try:
+                if os.path.isfile(path):
+                    os.remove(path)
+            except Exception:
+                pass  # Silently skip if file deletion fails
+
+
+def upload_status_text(sent_count, total_files):
+    """Upload progress message with a 20-step bar"""
+    progress_percentage = (sent_count / total_files) * 100 if total_files else 100
+    filled = int(20 * sent_count / total_files) if total_files else 20
+    bar = '█' * filled + '░' * (20 - filled)
+    
+    return (
+        f"📤 **Uploading Files**\n\n"
+        f"{bar} {progress_percentage:.0f}%\n"
+        f"**Files:** {sent_count} / {total_files} uploaded\n\n"
+        f"Use /cancel to stop"
+    )
 
 
 async def get_log_channel():
@@ -0,0 +1,307 @@
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from plugins.force_sub import check_force_subscription
+from plugins.cancel import start_process, end_process, is_cancelled
+from plugins.unzip import send_part, get_log_channel
+from utils.quota_manager import check_user_quota, check_file_size, increment_user_quota
+from utils.file_handler import cleanup_files
+from utils.archive_cache import acquire_archive, release_archive
+from utils.helpers import format_size
+from utils.worker_pool import run_in_pool
+from utils.bundler import append_member
+from utils.splitter import FileSection
+from utils.thumbnails import get_thumbnail, release_thumbnail
+from utils.filename_transformer import unique_names
+from database.user_settings_helper import get_user_settings
+from config import MAX_CONCURRENT_DOWNLOADS, UPLOAD_LIMIT_BYTES, ZIP_MAX_FILES, ZIP_HISTORY_FILES
+from collections import deque
+import os
+import time
+import random
+import asyncio
+
+
+# Message ids of the files each user sent recently, in arrival order.
+# A bot's private chats share one message id counter, so a user's files
+# can't be found by scanning an id range
+recent_files = {}
+
+
+@Client.on_message(filters.private & (filters.document | filters.video | filters.audio), group=11)
+async def remember_file(client: Client, message: Message):
+    """Remember the files users send so /zip can find them"""
+    if message.from_user:
+        recent_files.setdefault(message.from_user.id, deque(maxlen=ZIP_HISTORY_FILES)).append(message.id)
+
+
+@Client.on_message(filters.command("zip") & filters.private)
+async def zip_command(client: Client, message: Message):
+    """Handle /zip command - pack the files the user sent into one archive"""
+    user_id = message.from_user.id
+
+    # Check force subscription
+    is_subscribed, buttons = await check_force_subscription(client, user_id)
+    if not is_subscribed:
+        await message.reply_text(
+            "❌ **Access Denied!**\n\n"
+            "You must join the following channels to use this bot:",
+            reply_markup=buttons
+        )
+        return
+
+    replied_msg = message.reply_to_message
+    if not replied_msg or not get_media(replied_msg):
+        await message.reply_text(
+            "❌ **Invalid Usage!**\n\n"
+            "Send or forward the files you want to pack, then reply to the "
+            "**first** of them with:\n"
+            "• `/zip` - pack everything sent from that file on\n"
+            "• `/zip name` - choose the archive name\n\n"
+            f"Up to {ZIP_MAX_FILES} files can be packed at once."
+        )
+        return
+
+    # Everything the user sent between the replied file and this command,
+    # plus the rest of its album
+    message_ids = {
+        msg_id for msg_id in recent_files.get(user_id, ())
+        if replied_msg.id <= msg_id < message.id
+    }
+    message_ids.add(replied_msg.id)
+    if replied_msg.media_group_id:
+        try:
+            message_ids.update(msg.id for msg in await client.get_media_group(user_id, replied_msg.id))
+        except Exception:
+            pass
+
+    message_ids = sorted(message_ids)
+    file_messages = []
+    for start in range(0, len(message_ids), 200):
+        batch = await client.get_messages(user_id, message_ids[start:start + 200])
+        file_messages.extend(
+            msg for msg in batch
+            if msg and not msg.empty and msg.from_user and msg.from_user.id == user_id and get_media(msg)
+        )
+
+    if len(file_messages) > ZIP_MAX_FILES:
+        await message.reply_text(
+            f"⚠️ You sent {len(file_messages)} files - only the first {ZIP_MAX_FILES} are packed, "
+            f"{len(file_messages) - ZIP_MAX_FILES} were left out."
+        )
+        file_messages = file_messages[:ZIP_MAX_FILES]
+
+    args = message.text.split(maxsplit=1)
+    await handle_file_packing(client, message, file_messages, args[1] if len(args) > 1 else None)
+
+
+def get_media(message: Message):
+    """The document, video or audio of a message, or None"""
+    return message.document or message.video or message.audio
+
+
+def archive_name(file_messages, requested=None):
+    """Output name: the name from the command, or the first file's name"""
+    if requested:
+        name = os.path.basename(requested.strip().strip('"'))
+    else:
+        first = get_media(file_messages[0])
+        name = os.path.splitext(first.file_name or 'files')[0]
+    name = name or 'files'
+    return name if name.lower().endswith('.zip') else f"{name}.zip"
+
+
+def member_names(file_messages):
+    """Archive member name for every file, numbering repeated names"""
+    return unique_names([os.path.basename(get_media(msg).file_name or f"file_{msg.id}") for msg in file_messages])
+
+
+async def handle_file_packing(client: Client, message: Message, file_messages: list, requested_name=None):
+    """
+    Download a batch of files and pack them into one zip
+
+    Up to MAX_CONCURRENT_DOWNLOADS files download at once. Each finished
+    download is appended to the zip by a worker while the others continue,
+    and every full upload-sized part of the zip is uploaded as soon as its
+    bytes are final, so uploading overlaps packing. The zip itself stays
+    on disk until the job ends.
+    """
+    user_id = message.from_user.id
+
+    total_size = sum(get_media(msg).file_size for msg in file_messages)
+    output_name = archive_name(file_messages, requested_name)
+
+    # Check user quota
+    can_proceed, quota_msg, tier = check_user_quota(user_id)
+    if not can_proceed:
+        await message.reply_text(quota_msg)
+        return
+
+    # The batch counts as one file of its combined size
+    can_proceed, size_msg = check_file_size(user_id, total_size)
+    if not can_proceed:
+        await message.reply_text(size_msg)
+        return
+
+    start_process(user_id, 'zip', filename=output_name)
+
+    status_msg = await message.reply_text(
+        f"**📦 Creating Archive**\n\n"
+        f"**Name:** `{output_name}`\n"
+        f"**Files:** {len(file_messages)} ({format_size(total_size)})\n\n"
+        f"⏳ Starting downloads...\n\n"
+        f"Use /cancel to stop"
+    )
+
+    zip_path = f"downloads/zip_{user_id}_{random.randint(100000, 999999)}.zip"
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    downloaded_paths = []
+
+    async def fetch(msg, arcname):
+        async with semaphore:
+            if is_cancelled(user_id):
+                return arcname, None
+            # One file that can't be downloaded shouldn't sink the whole bundle
+            try:
+                file_path, _ = await acquire_archive(client, msg)
+            except Exception as e:
+                print(f"Error downloading {arcname} for /zip: {e}")
+                return arcname, None
+            if file_path:
+                downloaded_paths.append(file_path)
+            return arcname, file_path
+
+    settings = get_user_settings(user_id)
+    thumb_path = await get_thumbnail(client, settings.get('thumbnail'))
+    log_channel_id = await get_log_channel()
+
+    # Bytes of the zip that won't change any more, and parts already sent
+    stable_size = 0
+    sent_parts = 0
+    upload_task = None
+
+    def part_name(number):
+        return f"{output_name}.{number:03d}"
+
+    async def upload_final_parts():
+        nonlocal sent_parts
+        while stable_size >= (sent_parts + 1) * UPLOAD_LIMIT_BYTES:
+            part = FileSection(zip_path, sent_parts * UPLOAD_LIMIT_BYTES, UPLOAD_LIMIT_BYTES,
+                               part_name(sent_parts + 1))
+            await send_part(client, user_id, part, f"📦 `{output_name}`\n**Part {sent_parts + 1}**",
+                            thumb_path, log_channel_id)
+            sent_parts += 1
+
+    tasks = [asyncio.ensure_future(fetch(msg, arcname))
+             for msg, arcname in zip(file_messages, member_names(file_messages))]
+    packed = 0
+    failed = []
+    last_update = 0
+
+    try:
+        for next_download in asyncio.as_completed(tasks):
+            arcname, file_path = await next_download
+
+            if is_cancelled(user_id):
+                await status_msg.edit_text("⏸️ Process cancelled by user.")
+                return
+
+            if not file_path:
+                failed.append(arcname)
+                continue
+
+            stable_size = await run_in_pool(append_member, zip_path, file_path, arcname)
+            release_archive(file_path)
+            downloaded_paths.remove(file_path)
+            packed += 1
+
+            # Upload parts whose bytes are final while the rest is still packing
+            if stable_size >= (sent_parts + 1) * UPLOAD_LIMIT_BYTES and (upload_task is None or upload_task.done()):
+                if upload_task is not None:
+                    await upload_task
+                upload_task = asyncio.ensure_future(upload_final_parts())
+
+            if time.time() - last_update >= 5:
+                last_update = time.time()
+                try:
+                    await status_msg.edit_text(
+                        f"📦 Packing `{output_name}`...\n\n"
+                        f"**Packed:** {packed} / {len(file_messages)}\n"
+                        f"**Archive:** {format_size(os.path.getsize(zip_path))}\n"
+                        f"**Parts Sent:** {sent_parts}\n\n"
+                        f"Use /cancel to stop"
+                    )
+                except:
+                    pass
+
+        if upload_task is not None:
+            await upload_task
+
+        if not packed:
+            await status_msg.edit_text("❌ None of the files could be downloaded!")
+            return
+
+        if is_cancelled(user_id):
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+            return
+
+        zip_size = os.path.getsize(zip_path)
+        await status_msg.edit_text(
+            f"📤 Uploading `{output_name}` ({format_size(zip_size)})...\n\nUse /cancel to stop"
+        )
+
+        if sent_parts == 0 and zip_size <= UPLOAD_LIMIT_BYTES:
+            sent_msg = await client.send_document(
+                chat_id=user_id,
+                document=zip_path,
+                file_name=output_name,
+                caption=f"📦 `{output_name}` - {packed} file(s)",
+                thumb=thumb_path
+            )
+            if log_channel_id and sent_msg:
+                try:
+                    await sent_msg.copy(log_channel_id)
+                except Exception:
+                    pass
+        else:
+            # The rest of the zip, central directory included
+            part_count = -(-zip_size // UPLOAD_LIMIT_BYTES)
+            for number in range(sent_parts + 1, part_count + 1):
+                start = (number - 1) * UPLOAD_LIMIT_BYTES
+                part = FileSection(zip_path, start, min(UPLOAD_LIMIT_BYTES, zip_size - start), part_name(number))
+                caption = f"📦 `{output_name}`\n**Part {number} of {part_count}**"
+                if number == part_count:
+                    caption += f"\n\nJoin with 7-Zip, or `cat {output_name}.0* > \"{output_name}\"`"
+                await send_part(client, user_id, part, caption, thumb_path, log_channel_id)
+
+        increment_user_quota(user_id, output_name, total_size)
+
+        text = (
+            f"✅ **Archive Created!**\n\n"
+            f"**Name:** `{output_name}`\n"
+            f"**Packed:** {packed} file(s)\n"
+            f"**Size:** {format_size(total_size)} → {format_size(zip_size)}"
+        )
+        if failed:
+            text += f"\n**Failed:** {len(failed)} - " + ", ".join(f"`{name}`" for name in failed[:10])
+        await status_msg.edit_text(text)
+
+    except Exception as e:
+        if "cancelled" in str(e).lower():
+            await status_msg.edit_text("⏸️ Process cancelled by user.")
+        else:
+            await status_msg.edit_text(f"❌ Error while creating the archive: {str(e)}")
+
+    finally:
+        end_process(user_id)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if upload_task is not None:
+            upload_task.cancel()
+            await asyncio.gather(upload_task, return_exceptions=True)
+
+        for file_path in downloaded_paths:
+            release_archive(file_path)
+        release_thumbnail(thumb_path)
+        await cleanup_files([zip_path])
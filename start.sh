@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Install system dependencies
-apt-get update && apt-get install -y unrar
+apt-get update && apt-get install -y unrar p7zip-full libarchive-tools
 
 # Install Python dependencies
 pip install -r requirements.txt
@@ -0,0 +1,24 @@
+import zipfile
+
+import py7zr
+
+from utils.converter import convert_archive
+
+
+def test_7z_duplicate_names_are_kept(tmp_path):
+    source = tmp_path / 'source.7z'
+    with py7zr.SevenZipFile(source, 'w') as sz:
+        sz.writestr(b'first', 'dir/a.txt')
+        sz.writestr(b'second', 'b.txt')
+        sz.writestr(b'again', 'b.txt')
+
+    output = tmp_path / 'out.zip'
+    progress = {}
+    converted, skipped = convert_archive(str(source), None, '7z', 'zip', str(output), 'source.7z', progress)
+
+    assert (converted, skipped) == (3, 0)
+    assert progress['percent'] == 100
+    with zipfile.ZipFile(output) as zf:
+        assert {info.filename: zf.read(info) for info in zf.infolist()} == {
+            'dir/a.txt': b'first', 'b.txt': b'second', 'b.txt_0': b'again',
+        }
@@ -0,0 +1,44 @@
+import os
+import asyncio
+import zipfile
+
+import utils.file_handler as file_handler
+from utils.backends import _unrar_command, _sevenzip_command, _bsdtar_command
+
+
+SWITCH_NAMES = ['-so', '-op/tmp/escape', '@listfile']
+
+
+def _make_zip(path):
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name in SWITCH_NAMES + ['docs/readme.txt']:
+            zf.writestr(name, name.encode())
+
+
+def test_command_builders_stop_switch_parsing_before_members():
+    for build in (_unrar_command, _sevenzip_command, _bsdtar_command):
+        command = build('tool', 'archive.bin', 'out', SWITCH_NAMES)
+        separator = command.index('--')
+        assert all(command.index(name) > separator for name in SWITCH_NAMES)
+
+
+def test_filtered_extraction_never_reaches_native_tools(tmp_path, monkeypatch):
+    archive = tmp_path / 'switches.zip'
+    _make_zip(archive)
+
+    async def fail_native(*args, **kwargs):
+        raise AssertionError("member names were passed to a native tool")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_handler, 'get_backend', lambda ext: '7z')
+    monkeypatch.setattr(file_handler, 'run_native_backend', fail_native)
+
+    member_filter = {'include': ['-*', '@*', 'escape'], 'exclude': [], 'min_size': None, 'max_size': None}
+    success, extract_dir, manifest, error_msg = asyncio.run(
+        file_handler.extract_archive(str(archive), member_filter=member_filter)
+    )
+
+    assert success, error_msg
+    names = sorted(os.path.relpath(entry['path'], extract_dir).replace(os.sep, '/') for entry in manifest)
+    assert names == sorted(['-so', '-op/tmp/escape', '@listfile'])
+    assert not os.path.exists('/tmp/escape')
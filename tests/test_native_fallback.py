@@ -0,0 +1,37 @@
+import io
+import os
+import shutil
+import asyncio
+import tarfile
+
+import pytest
+
+import utils.file_handler as file_handler
+from utils.worker_pool import shutdown_pool
+
+
+@pytest.mark.skipif(not shutil.which('bsdtar'), reason="needs bsdtar")
+def test_native_failure_falls_back_to_python(tmp_path, monkeypatch):
+    archive = tmp_path / 'outer.tar'
+    with tarfile.open(archive, 'w') as tf:
+        for name, data in [('../evil.txt', b'evil'), ('good.txt', b'good')]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_handler, 'get_backend', lambda ext: 'bsdtar')
+    # Workers resolve the relative downloads/ paths from their own cwd
+    shutdown_pool()
+    try:
+        success, extract_dir, manifest, error_msg = asyncio.run(
+            file_handler.extract_archive(str(archive))
+        )
+    finally:
+        shutdown_pool()
+
+    assert success, error_msg
+    # The Python reader keeps unsafe names inside the extraction folder
+    names = sorted(os.path.relpath(entry['path'], extract_dir) for entry in manifest)
+    assert names == ['evil.txt', 'good.txt']
+    assert not (tmp_path / 'downloads' / 'evil.txt').exists()
@@ -0,0 +1,68 @@
+import io
+import os
+import shutil
+import asyncio
+import tarfile
+import zipfile
+
+import pytest
+
+import utils.file_handler as file_handler
+from utils.worker_pool import shutdown_pool
+
+
+def _zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _make_secret(tmp_path):
+    secret = tmp_path / 'secret' / 'private.zip'
+    secret.parent.mkdir()
+    secret.write_bytes(_zip_bytes({'secret.txt': b'host data'}))
+    return secret
+
+
+def test_symlinked_archives_are_not_nested(tmp_path):
+    secret = _make_secret(tmp_path)
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    (tree / 'real.zip').write_bytes(_zip_bytes({'inner.txt': b'inner'}))
+    os.symlink(secret, tree / 'evil.zip')
+
+    assert file_handler._find_archives(str(tree)) == [str(tree / 'real.zip')]
+    assert file_handler._directory_size(str(tree)) == (tree / 'real.zip').stat().st_size
+
+
+@pytest.mark.skipif(not shutil.which('bsdtar'), reason="bsdtar recreates symlinks, the Python readers don't")
+def test_recursive_extraction_ignores_symlinked_nested_archive(tmp_path, monkeypatch):
+    secret = _make_secret(tmp_path)
+    archive = tmp_path / 'outer.tar'
+    with tarfile.open(archive, 'w') as tf:
+        link = tarfile.TarInfo('evil.zip')
+        link.type = tarfile.SYMTYPE
+        link.linkname = str(secret)
+        tf.addfile(link)
+        data = _zip_bytes({'inner.txt': b'inner'})
+        real = tarfile.TarInfo('real.zip')
+        real.size = len(data)
+        tf.addfile(real, io.BytesIO(data))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_handler, 'get_backend', lambda ext: 'bsdtar')
+    # Workers resolve the relative downloads/ paths from their own cwd
+    shutdown_pool()
+    try:
+        success, extract_dir, manifest, error_msg = asyncio.run(
+            file_handler.extract_archive(str(archive), recursive=True)
+        )
+    finally:
+        shutdown_pool()
+
+    assert success, error_msg
+    names = sorted(os.path.relpath(entry['path'], extract_dir).replace(os.sep, '/') for entry in manifest)
+    assert names == ['real/inner.txt']
+    assert secret.exists()
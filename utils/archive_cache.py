@@ -0,0 +1,147 @@
+import os
+import time
+import shutil
+from config import ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MAX_BYTES, ARCHIVE_CACHE_TTL_SECONDS
+from utils.job_registry import join_job, wait_job, leave_job
+
+
+# file_unique_id -> {'path', 'size', 'refs', 'last_used'}
+_entries = {}
+_loaded = False
+
+
+def _load():
+    """Index archives kept from earlier runs, dropping unfinished downloads"""
+    global _loaded
+    _loaded = True
+    if not os.path.isdir(ARCHIVE_CACHE_DIR):
+        return
+
+    for key in os.listdir(ARCHIVE_CACHE_DIR):
+        folder = os.path.join(ARCHIVE_CACHE_DIR, key)
+        files = [name for name in os.listdir(folder) if not name.endswith('.temp')] if os.path.isdir(folder) else []
+        if len(files) != 1:
+            shutil.rmtree(folder, ignore_errors=True)
+            continue
+        path = os.path.join(folder, files[0])
+        stat = os.stat(path)
+        _entries[key] = {'path': path, 'size': stat.st_size, 'refs': 0, 'last_used': stat.st_mtime}
+
+
+def _remove(key):
+    entry = _entries.pop(key)
+    shutil.rmtree(os.path.dirname(entry['path']), ignore_errors=True)
+
+
+def _evict(incoming=0):
+    """
+    Drop expired archives, then least recently used ones until the cache
+    has room for incoming bytes. Archives in use by a job are never dropped.
+    """
+    now = time.time()
+    idle = sorted(
+        (entry['last_used'], key) for key, entry in _entries.items() if entry['refs'] == 0
+    )
+    for last_used, key in idle:
+        if now - last_used > ARCHIVE_CACHE_TTL_SECONDS:
+            _remove(key)
+
+    total = sum(entry['size'] for entry in _entries.values())
+    for _, key in idle:
+        if total + incoming <= ARCHIVE_CACHE_MAX_BYTES:
+            break
+        if key in _entries:
+            total -= _entries[key]['size']
+            _remove(key)
+
+
+async def acquire_archive(client, message, progress=None, check=None):
+    """
+    Get the file of a message from the archive cache, downloading it on a miss
+
+    Files are cached by file_unique_id, so retrying an archive with another
+    password or settings doesn't download it again, and requests for a file
+    that is still downloading wait for that download instead of starting
+    their own. Every call that returns a path must be paired with
+    release_archive().
+
+    Args:
+        client: Pyrogram client
+        message: Message with a document, video or audio
+        progress (callable or None): Async progress(current, total), called
+            while the file downloads; raising from it cancels the wait
+        check (callable or None): Async check() run on a miss before the
+            download starts; returns an error message to refuse the file
+
+    Returns:
+        tuple: (path or None, error message or None); path is None without
+        an error when the download failed
+    """
+    media = message.document or message.video or message.audio
+    if not media:
+        return None, None
+    if not _loaded:
+        _load()
+
+    key = media.file_unique_id
+    entry = _entries.get(key)
+    if entry and os.path.isfile(entry['path']):
+        entry['refs'] += 1
+        entry['last_used'] = time.time()
+        return entry['path'], None
+    if entry:
+        _entries.pop(key)
+
+    async def start_download(job):
+        async def track(current, total):
+            job['progress'].update(current=current, total=total)
+            if job['refs'] == 0:
+                raise Exception("Process cancelled by user")
+
+        # Cached files were checked when they were downloaded
+        if check:
+            error = await check()
+            if error:
+                return None, error
+
+        _evict(media.file_size)
+        folder = os.path.join(ARCHIVE_CACHE_DIR, key)
+        file_name = os.path.basename(getattr(media, 'file_name', None) or f'file_{message.id}')
+        try:
+            path = await client.download_media(message, file_name=os.path.join(folder, file_name), progress=track)
+        except BaseException:
+            shutil.rmtree(folder, ignore_errors=True)
+            raise
+        if not path:
+            shutil.rmtree(folder, ignore_errors=True)
+            return None, None
+
+        # Everyone still waiting for the download holds a reference
+        _entries[key] = {'path': path, 'size': os.path.getsize(path), 'refs': job['refs'], 'last_used': time.time()}
+        return path, None
+
+    async def show_progress(shared):
+        if progress:
+            await progress(shared.get('current', 0), shared.get('total') or media.file_size)
+
+    job = join_job(('download', key), start_download)
+    try:
+        return await wait_job(job, on_progress=show_progress)
+    except BaseException:
+        # A download that finished just before the wait was given up
+        # already counted this caller in
+        task = job['task']
+        if task.done() and not task.cancelled() and task.exception() is None and task.result()[0]:
+            release_archive(task.result()[0])
+        raise
+    finally:
+        await leave_job(job)
+
+
+def release_archive(path):
+    """Stop using a cached archive; idle archives are evicted once over budget or expired"""
+    entry = _entries.get(os.path.basename(os.path.dirname(path)))
+    if entry and entry['path'] == path:
+        entry['refs'] = max(0, entry['refs'] - 1)
+        entry['last_used'] = time.time()
+    _evict()
@@ -0,0 +1,291 @@
+import os
+import re
+import time
+import shutil
+import random
+import asyncio
+import tempfile
+import zipfile
+import tarfile
+from utils.worker_pool import memory_limited_command, limit_child_memory
+
+
+# Percentages printed by native tools (unrar and 7z redraw them with \b and \r)
+PERCENT_PATTERN = re.compile(rb'(\d{1,3})%')
+
+# Line separators used by native tools when redrawing progress
+PROGRESS_SEPARATORS = re.compile(rb'[\r\n\b]+')
+
+# Exit codes meaning "wrong password" per backend
+PASSWORD_EXIT_CODES = {
+    'unrar': [11],
+}
+
+# Exit code used by unrar and 7z for "not enough memory"
+MEMORY_EXIT_CODE = 8
+
+# Registered native backends: {name: {"binaries": [...], "formats": [...], "command": func}}
+BACKENDS = {}
+
+# Backend chosen per format by the startup benchmark ('python' = built-in readers)
+selected_backends = {}
+
+
+# Native tools only get unencrypted archives: a password on their command
+# line would be readable by anyone through /proc/<pid>/cmdline
+
+def _unrar_command(binary, file_path, extract_dir, members):
+    """Build unrar command line"""
+    command = [binary, 'x', '-y', '-o+', '-idc', '-p-']
+    # Names after -- are never read as switches
+    command.extend(['--', file_path])
+    command.extend(members or [])
+    command.append(extract_dir.rstrip('/') + '/')
+    return command
+
+
+def _sevenzip_command(binary, file_path, extract_dir, members):
+    """Build 7z command line"""
+    command = [binary, 'x', '-y', '-bsp1', '-bso0', '-bse1', '-spd', f'-o{extract_dir}']
+    command.extend(['--', file_path])
+    command.extend(members or [])
+    return command
+
+
+def _bsdtar_command(binary, file_path, extract_dir, members):
+    """Build bsdtar command line (prints one line per extracted member)"""
+    command = [binary, '-x', '-v', '-f', file_path, '-C', extract_dir]
+    command.append('--')
+    command.extend(members or [])
+    return command
+
+
+def register_backend(name, binaries, formats, command):
+    """
+    Register a native extraction backend
+
+    Args:
+        name (str): Backend name
+        binaries (list): Executable names to look for on PATH
+        formats (list): Archive extensions the tool handles
+        command (callable): Builds argv from (binary, file_path, extract_dir, members)
+    """
+    BACKENDS[name] = {
+        "binaries": binaries,
+        "formats": formats,
+        "command": command
+    }
+
+
+register_backend('unrar', ['unrar'], ['rar'], _unrar_command)
+register_backend('7z', ['7zz', '7z', '7za'], ['7z', 'zip', 'tar', 'gz', 'bz2', 'xz'], _sevenzip_command)
+register_backend('bsdtar', ['bsdtar'], ['zip', 'tar', 'gz', 'bz2', 'xz'], _bsdtar_command)
+
+
+def find_binary(name):
+    """Get full path of the first installed binary for a backend"""
+    for binary in BACKENDS[name]["binaries"]:
+        path = shutil.which(binary)
+        if path:
+            return path
+    return None
+
+
+def available_backends(ext):
+    """Get installed native backends that support the given format"""
+    return [
+        name for name, backend in BACKENDS.items()
+        if ext in backend["formats"] and find_binary(name)
+    ]
+
+
+def get_backend(ext):
+    """
+    Get the backend to use for a format
+
+    Returns:
+        str or None: Native backend name, or None for the built-in Python readers
+    """
+    name = selected_backends.get(ext)
+    if name and name != 'python' and find_binary(name):
+        return name
+    return None
+
+
+def parse_progress(buffer, progress):
+    """
+    Parse buffered tool output and update the shared progress dict
+
+    Args:
+        buffer (bytes): Unconsumed output (may end with a partial line)
+        progress (dict or None): Updated with 'percent' and 'members'
+
+    Returns:
+        bytes: Remaining partial line to keep for the next chunk
+    """
+    parts = PROGRESS_SEPARATORS.split(buffer)
+    remainder = parts.pop()
+
+    if progress is not None:
+        for line in parts:
+            match = PERCENT_PATTERN.search(line)
+            if match:
+                progress['percent'] = min(int(match.group(1)), 100)
+            elif line.startswith(b'x '):
+                # bsdtar -v prints "x <name>" for every member
+                progress['members'] = progress.get('members', 0) + 1
+
+    return remainder
+
+
+async def run_native_backend(name, file_path, extract_dir, members=None,
+                             progress=None, cancel_check=None):
+    """
+    Extract with a native tool, streaming its progress output
+
+    Args:
+        name (str): Backend name
+        file_path (str): Archive path (unencrypted)
+        extract_dir (str): Destination directory
+        members (iterable or None): Member names to extract, None for all
+        progress (dict or None): Shared progress dict for status updates
+        cancel_check (callable or None): Returns True when the job should stop
+
+    Raises:
+        MemoryError: If the tool ran out of its per-job memory
+        RuntimeError: If the tool fails or the job is cancelled
+    """
+    command = BACKENDS[name]["command"](
+        find_binary(name), file_path, extract_dir, sorted(members) if members is not None else None
+    )
+
+    # No preexec_fn: it can deadlock the child of a process running threads
+    process = await asyncio.create_subprocess_exec(
+        *memory_limited_command(command),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    limit_child_memory(process.pid)
+
+    output_tail = b''
+    buffer = b''
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(process.stdout.read(4096), timeout=0.5)
+            except asyncio.TimeoutError:
+                chunk = None
+
+            if cancel_check and cancel_check():
+                raise RuntimeError("Process cancelled by user")
+
+            if chunk is None:
+                continue
+            if not chunk:
+                break
+
+            output_tail = (output_tail + chunk)[-2048:]
+            buffer = parse_progress(buffer + chunk, progress)
+
+        parse_progress(buffer + b'\n', progress)
+        return_code = await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    if return_code != 0:
+        message = PROGRESS_SEPARATORS.sub(b'\n', output_tail).decode('utf-8', 'replace').strip()
+        if return_code == MEMORY_EXIT_CODE or 'memory' in message.lower():
+            raise MemoryError(f"{name} ran out of memory")
+        if return_code in PASSWORD_EXIT_CODES.get(name, []) or 'password' in message.lower():
+            raise RuntimeError(f"Wrong password or password required ({name})")
+        raise RuntimeError(f"{name} failed with exit code {return_code}: {message[-300:]}")
+
+
+def _create_benchmark_samples(directory):
+    """Create small sample archives for the formats Python can write"""
+    payload = os.urandom(256 * 1024) + b'unzip bot benchmark\n' * 100000
+    source = os.path.join(directory, 'sample.bin')
+    with open(source, 'wb') as f:
+        f.write(payload)
+
+    samples = {}
+
+    samples['zip'] = os.path.join(directory, 'sample.zip')
+    with zipfile.ZipFile(samples['zip'], 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.write(source, 'sample.bin')
+
+    for ext, mode in [('tar', 'w'), ('gz', 'w:gz'), ('bz2', 'w:bz2'), ('xz', 'w:xz')]:
+        samples[ext] = os.path.join(directory, f'sample.{ext}')
+        with tarfile.open(samples[ext], mode) as tf:
+            tf.add(source, 'sample.bin')
+
+    import py7zr
+    samples['7z'] = os.path.join(directory, 'sample.7z')
+    with py7zr.SevenZipFile(samples['7z'], 'w') as sz:
+        sz.write(source, 'sample.bin')
+
+    return samples
+
+
+async def _time_extraction(extract, directory):
+    """Time one extraction into a fresh directory"""
+    extract_dir = os.path.join(directory, f'out_{random.randint(100000, 999999)}')
+    os.makedirs(extract_dir)
+    start = time.perf_counter()
+    try:
+        await extract(extract_dir)
+        return time.perf_counter() - start
+    except Exception:
+        return None
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+async def select_backends():
+    """
+    Pick the fastest backend per format with a startup micro-benchmark
+
+    Formats without an installed native tool keep the Python readers.
+    RAR samples can't be created here, so an installed unrar is trusted
+    (rarfile shells out to it anyway).
+
+    Returns:
+        dict: Selected backend per format
+    """
+    from utils.file_handler import run_python_extraction
+
+    formats = ['zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz']
+    selected_backends.update({ext: 'python' for ext in formats})
+
+    if 'unrar' in available_backends('rar'):
+        selected_backends['rar'] = 'unrar'
+
+    if not any(available_backends(ext) for ext in formats if ext != 'rar'):
+        return dict(selected_backends)
+
+    with tempfile.TemporaryDirectory() as directory:
+        samples = _create_benchmark_samples(directory)
+
+        for ext, sample in samples.items():
+            candidates = available_backends(ext)
+            if not candidates:
+                continue
+
+            timings = {
+                'python': await _time_extraction(
+                    lambda out: run_python_extraction(sample, None, out, ext), directory
+                )
+            }
+            for name in candidates:
+                timings[name] = await _time_extraction(
+                    lambda out, name=name: run_native_backend(name, sample, out), directory
+                )
+
+            working = {name: t for name, t in timings.items() if t is not None}
+            if working:
+                selected_backends[ext] = min(working, key=working.get)
+
+    return dict(selected_backends)
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import zipfile
+from config import BUNDLE_MEMBER_MAX_BYTES, BUNDLE_TARGET_BYTES, EXTRACT_CHUNK_SIZE
+from utils.worker_pool import run_in_pool
+
+
+# Already compressed formats are stored as-is instead of deflated again
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.mkv', '.webm', '.mov', '.avi',
+    '.mp3', '.m4a', '.ogg', '.flac', '.zip', '.rar', '.7z', '.gz', '.bz2', '.xz',
+    '.apk', '.jar', '.docx', '.xlsx', '.pptx', '.pdf', '.woff', '.woff2',
+}
+
+
+def plan_bundles(manifest, max_member_size=BUNDLE_MEMBER_MAX_BYTES, target_size=BUNDLE_TARGET_BYTES):
+    """
+    Split a manifest into bundles of small files and files sent on their own
+
+    Small files are packed in archive order, so each bundle holds whole
+    neighbouring folders wherever possible.
+
+    Args:
+        manifest (list): Manifest entries from extraction
+        max_member_size (int): Files below this size are bundled
+        target_size (int): Bundle size to aim for
+
+    Returns:
+        tuple: (bundles: list of entry lists, singles: list of entries)
+    """
+    small = [entry for entry in manifest if entry['size'] < max_member_size]
+    if len(small) < 2:
+        return [], list(manifest)
+
+    bundles = [[]]
+    bundle_size = 0
+    for entry in small:
+        if bundles[-1] and bundle_size + entry['size'] > target_size:
+            bundles.append([])
+            bundle_size = 0
+        bundles[-1].append(entry)
+        bundle_size += entry['size']
+
+    # A lone leftover file isn't worth its own zip
+    singles = [entry for entry in manifest if entry['size'] >= max_member_size]
+    if len(bundles) > 1 and len(bundles[-1]) == 1:
+        singles.insert(0, bundles.pop()[0])
+
+    return bundles, singles
+
+
+def write_bundle(entries, extract_dir, bundle_path, remove_sources=True):
+    """
+    Zip a group of extracted files, keeping their folder structure (runs in a worker)
+
+    Each source file is removed once it is in the bundle, so the disk never
+    holds both copies of the whole group. Sources shared with other jobs
+    are kept with remove_sources=False.
+
+    Returns:
+        int: Bundle size in bytes
+    """
+    with zipfile.ZipFile(bundle_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as bundle:
+        for entry in entries:
+            arcname = os.path.relpath(entry['path'], extract_dir).replace(os.sep, '/')
+            _add_file(bundle, entry['path'], arcname)
+            if remove_sources:
+                os.remove(entry['path'])
+
+    return os.path.getsize(bundle_path)
+
+
+def append_member(zip_path, source_path, arcname):
+    """
+    Append one file to a zip that is still being built (runs in a worker)
+
+    The zip is reopened for every member, so files can be added in whatever
+    order their downloads finish. Only the central directory at the end is
+    rewritten - every byte before it is final once this returns.
+
+    Returns:
+        int: Offset where the central directory starts
+    """
+    with zipfile.ZipFile(zip_path, 'a', zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        _add_file(archive, source_path, arcname)
+    return archive.start_dir
+
+
+def _add_file(archive, path, arcname):
+    """Stream a file into an open zip, storing already compressed formats"""
+    ext = os.path.splitext(arcname)[1].lower()
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    with open(path, 'rb') as src, archive.open(info, 'w') as dst:
+        while True:
+            chunk = src.read(EXTRACT_CHUNK_SIZE)
+            if not chunk:
+                break
+            dst.write(chunk)
+
+
+async def iter_bundles(bundles, extract_dir, bundle_dir=None, remove_sources=True):
+    """
+    Write bundles one after another in the worker pool
+
+    The next bundle is already being written while the caller uploads the
+    one just yielded.
+
+    Args:
+        bundles (list): Groups of manifest entries from plan_bundles()
+        extract_dir (str): Folder the entries were extracted to
+        bundle_dir (str or None): Where the bundles are written, extract_dir by default
+        remove_sources (bool): Delete files once they are bundled
+
+    Yields:
+        tuple: (index, bundle_path, entries)
+    """
+    def bundle_path(index):
+        return os.path.join(bundle_dir or extract_dir, f'.bundle_{index + 1}.zip')
+
+    if not bundles:
+        return
+
+    pending = asyncio.ensure_future(run_in_pool(write_bundle, bundles[0], extract_dir, bundle_path(0), remove_sources))
+    try:
+        for index, entries in enumerate(bundles):
+            await pending
+            if index + 1 < len(bundles):
+                pending = asyncio.ensure_future(
+                    run_in_pool(write_bundle, bundles[index + 1], extract_dir, bundle_path(index + 1), remove_sources)
+                )
+            yield index, bundle_path(index), entries
+    finally:
+        # Let a bundle still being written finish before its folder is cleaned up
+        await asyncio.gather(pending, return_exceptions=True)
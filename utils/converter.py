@@ -0,0 +1,357 @@
+import os
+import time
+import tarfile
+import zipfile
+import rarfile
+import py7zr
+from py7zr.io import Py7zIO, WriterFactory
+from py7zr.exceptions import Bad7zFile
+from py7zr.helpers import get_sanitized_output_path
+from config import EXTRACT_CHUNK_SIZE
+from utils.bundler import STORED_EXTENSIONS
+from utils.member_writer import safe_member_path
+from utils.decompress import STREAM_OPENERS, TAR_ALIASES, is_compressed_tar, decompressed_name
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:  # tar.zst output is optional
+        zstd = None
+
+
+# Output formats and the extension of the converted file
+CONVERT_TARGETS = {
+    'zip': '.zip',
+    'tar.zst': '.tar.zst',
+}
+
+# Level used for tar.zst output (zstd default is 3)
+ZSTD_LEVEL = 3
+
+
+def available_targets():
+    """Get the output formats this server can produce"""
+    return [target for target in CONVERT_TARGETS if target != 'tar.zst' or zstd is not None]
+
+
+def converted_name(file_name, target):
+    """Output file name (movies.part.rar -> movies.part.zip)"""
+    name = file_name
+    for suffix in ['.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.tbz2', '.txz',
+                   '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz']:
+        if name.lower().endswith(suffix) and len(name) > len(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name + CONVERT_TARGETS[target]
+
+
+class _ZipTarget:
+    """Writes members into a zip, deflating only what isn't compressed already"""
+
+    def __init__(self, output_path):
+        self._zip = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6)
+
+    def open_member(self, name, size, mtime):
+        info = zipfile.ZipInfo(name, date_time=time.localtime(max(mtime, 315532800))[:6])
+        ext = os.path.splitext(name)[1].lower()
+        info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        if size is None:
+            # Unknown size: always reserve room for zip64 sizes
+            return self._zip.open(info, 'w', force_zip64=True)
+        info.file_size = size
+        return self._zip.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT)
+
+    def close(self):
+        self._zip.close()
+
+
+class _TarMember:
+    """Writable tar member body: pads to the block size on close"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._written = 0
+
+    def write(self, data):
+        self._written += len(data)
+        return self._stream.write(data)
+
+    def close(self):
+        remainder = self._written % tarfile.BLOCKSIZE
+        if remainder:
+            self._stream.write(b'\0' * (tarfile.BLOCKSIZE - remainder))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _TarZstdTarget:
+    """Writes members into a zstd-compressed tar stream"""
+
+    def __init__(self, output_path):
+        self._stream = zstd.open(output_path, 'wb', level=ZSTD_LEVEL)
+
+    def open_member(self, name, size, mtime):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        self._stream.write(info.tobuf(tarfile.PAX_FORMAT, tarfile.ENCODING, 'surrogateescape'))
+        return _TarMember(self._stream)
+
+    def close(self):
+        # End of archive: two zero blocks
+        self._stream.write(b'\0' * tarfile.BLOCKSIZE * 2)
+        self._stream.close()
+
+
+def _open_target(target, output_path):
+    if target == 'zip':
+        return _ZipTarget(output_path)
+    if target == 'tar.zst':
+        if zstd is None:
+            raise ValueError("tar.zst output needs Python 3.14 or the backports.zstd package")
+        return _TarZstdTarget(output_path)
+    raise ValueError(f"Unsupported output format: {target}")
+
+
+def _member_name(name):
+    """Normalised member path, or None for names that can't be stored safely"""
+    path = safe_member_path('', name)
+    return path.replace(os.sep, '/') if path else None
+
+
+def _copy_member(src, dst):
+    while True:
+        chunk = src.read(EXTRACT_CHUNK_SIZE)
+        if not chunk:
+            return
+        dst.write(chunk)
+
+
+class _TargetMemberWriter(Py7zIO):
+    """Forwards one decoded 7z member into the open target member"""
+
+    def __init__(self, dst):
+        self._dst = dst
+        self._size = 0
+
+    def write(self, s):
+        self._size += len(s)
+        if self._dst is not None:
+            self._dst.write(s)
+        return len(s)
+
+    def read(self, size=None):
+        return b''
+
+    def seek(self, offset, whence=0):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return self._size
+
+    def close(self):
+        if self._dst is not None:
+            self._dst.close()
+            self._dst = None
+
+
+class _TargetWriterFactory(WriterFactory):
+    """
+    Opens a target member for every 7z member as the decoder reaches it
+
+    The archive is decoded sequentially, so members arrive one after
+    another and the previous member is finished when the next starts.
+    """
+
+    def __init__(self, target, files, progress=None):
+        self._target = target
+        self._files = files
+        self._progress = progress
+        self._total = sum(f.uncompressed for f in files.values()) or 1
+        self._done = 0
+        self._current = None
+        self.converted = 0
+        self.skipped = 0
+
+    def create(self, filename):
+        self.finish()
+        f = self._files.get(filename)
+        name = _member_name(filename) if f is not None else None
+        dst = None
+        if name:
+            mtime = f.lastwritetime.totimestamp() if f.lastwritetime else time.time()
+            dst = self._target.open_member(name, f.uncompressed, mtime)
+            self.converted += 1
+        else:
+            self.skipped += 1
+        self._current = _TargetMemberWriter(dst)
+        return self._current
+
+    def finish(self):
+        if self._current is not None:
+            self._done += self._current.size()
+            self._current.close()
+            self._current = None
+            if self._progress is not None:
+                self._progress['percent'] = min(int(self._done * 100 / self._total), 100)
+
+
+def _convert_7z(file_path, password, target, progress):
+    # A file object keeps py7zr on one thread decoding folder after folder,
+    # so the header is parsed once and members reach the target in order
+    with open(file_path, 'rb') as raw, py7zr.SevenZipFile(raw, mode='r', password=password or None) as sz_ref:
+        # Key members by the name py7zr hands the factory: paths are
+        # sanitized and later duplicates get a _0, _1... suffix. Names py7zr
+        # refuses would abort the whole decode, so they are left out
+        files = {}
+        targets = []
+        seen = {}
+        skipped = 0
+        for f in sz_ref.files:
+            try:
+                get_sanitized_output_path(f.filename, None)
+            except Bad7zFile:
+                skipped += 0 if f.is_directory else 1
+                continue
+            targets.append(f.filename)
+            if f.filename not in seen:
+                outname = f.filename
+                seen[f.filename] = 0
+            else:
+                outname = f"{f.filename}_{seen[f.filename]}"
+                seen[f.filename] += 1
+            if not f.is_directory and not f.is_socket:
+                files[get_sanitized_output_path(outname, None).as_posix()] = f
+
+        factory = _TargetWriterFactory(target, files, progress)
+        try:
+            if targets:
+                sz_ref.extract(targets=targets, factory=factory)
+        finally:
+            factory.finish()
+    return factory.converted, factory.skipped + skipped
+
+
+def _convert_members(members, target, progress):
+    """Copy (name, size, mtime, open_stream) members into the target"""
+    members = list(members)
+    total = sum(size or 0 for _, size, _, _ in members) or 1
+    done = 0
+    converted = 0
+    for name, size, mtime, open_stream in members:
+        name = _member_name(name)
+        if name:
+            with open_stream() as src, target.open_member(name, size, mtime) as dst:
+                _copy_member(src, dst)
+            converted += 1
+        done += size or 0
+        if progress is not None:
+            progress['percent'] = min(int(done * 100 / total), 100)
+    return converted, len(members) - converted
+
+
+def _convert_tar(file_path, target, progress):
+    total = os.path.getsize(file_path) or 1
+    converted = 0
+    skipped = 0
+    with open(file_path, 'rb') as raw, tarfile.open(fileobj=raw, mode='r|*') as tar_ref:
+        for member in tar_ref:
+            if not member.isfile():
+                continue
+            name = _member_name(member.name)
+            if not name:
+                skipped += 1
+                continue
+            with tar_ref.extractfile(member) as src, target.open_member(name, member.size, member.mtime) as dst:
+                _copy_member(src, dst)
+            converted += 1
+            if progress is not None:
+                progress['percent'] = min(int(raw.tell() * 100 / total), 100)
+    return converted, skipped
+
+
+def convert_archive(file_path, password, ext, target, output_path, file_name, progress=None):
+    """
+    Re-encode an archive into another format in one streaming pass (runs in a worker)
+
+    Members are decoded chunk by chunk straight into the output archive,
+    so no extracted copy is ever written to disk.
+
+    Args:
+        file_path (str): Source archive path
+        password (str or None): Source archive password
+        ext (str): Source format
+        target (str): 'zip' or 'tar.zst'
+        output_path (str): Where to write the converted archive
+        file_name (str): Original file name, used for single-file sources
+        progress (dict or None): Shared dict updated with 'percent'
+
+    Returns:
+        tuple: (members converted, members skipped because their names
+        can't be stored safely)
+    """
+    output = _open_target(target, output_path)
+    try:
+        if ext == 'zip':
+            zip_ref = zipfile.ZipFile(file_path)
+            if password:
+                zip_ref.setpassword(password.encode('utf-8'))
+            with zip_ref:
+                return _convert_members(
+                    ((info.filename, info.file_size, time.mktime(info.date_time + (0, 0, -1)),
+                      lambda info=info: zip_ref.open(info))
+                     for info in zip_ref.infolist() if not info.is_dir()),
+                    output, progress
+                )
+
+        if ext == 'rar':
+            with rarfile.RarFile(file_path) as rar_ref:
+                if password:
+                    rar_ref.setpassword(password)
+                return _convert_members(
+                    ((info.filename, info.file_size,
+                      info.mtime.timestamp() if info.mtime else time.mktime(info.date_time + (0, 0, -1)),
+                      lambda info=info: rar_ref.open(info))
+                     for info in rar_ref.infolist() if info.is_file()),
+                    output, progress
+                )
+
+        if ext == '7z':
+            return _convert_7z(file_path, password, output, progress)
+
+        if ext in STREAM_OPENERS or ext in TAR_ALIASES:
+            if not is_compressed_tar(file_path, ext):
+                # Single compressed file: its size is only known after decoding,
+                # which tar headers need up front but zip doesn't
+                size = None
+                if target != 'zip':
+                    with STREAM_OPENERS[ext](file_path, 'rb') as src:
+                        size = 0
+                        while True:
+                            chunk = src.read(EXTRACT_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            size += len(chunk)
+                return _convert_members(
+                    [(decompressed_name(file_name), size, os.path.getmtime(file_path),
+                      lambda: STREAM_OPENERS[ext](file_path, 'rb'))],
+                    output, progress
+                )
+            return _convert_tar(file_path, output, progress)
+
+        if ext == 'tar':
+            return _convert_tar(file_path, output, progress)
+
+        raise ValueError(f"Unsupported archive format: .{ext}")
+    finally:
+        output.close()
@@ -0,0 +1,86 @@
+import os
+import bz2
+import gzip
+import lzma
+import tarfile
+from config import EXTRACT_CHUNK_SIZE
+from utils.manifest import MemberDigest
+
+
+# Single-stream compressors by extension
+STREAM_OPENERS = {
+    'gz': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+
+# Extensions that are always compressed tar archives
+TAR_ALIASES = {
+    'tgz': 'gz',
+    'tbz2': 'bz2',
+    'txz': 'xz',
+}
+
+
+def is_compressed_tar(file_path, ext):
+    """
+    Check whether a .gz/.bz2/.xz file holds a tar archive
+
+    Only the first tar block is decompressed, so this is cheap even for
+    multi-gigabyte files.
+    """
+    if ext in TAR_ALIASES:
+        return True
+    
+    try:
+        with STREAM_OPENERS[ext](file_path, 'rb') as f:
+            block = f.read(tarfile.BLOCKSIZE)
+        tarfile.TarInfo.frombuf(block, tarfile.ENCODING, 'surrogateescape')
+        return True
+    except Exception:
+        return False
+
+
+def decompressed_name(file_name):
+    """Output name for a single compressed file (data.csv.gz -> data.csv)"""
+    name, ext = os.path.splitext(file_name)
+    return name if ext.lower() in ('.gz', '.bz2', '.xz') and name else file_name + '.out'
+
+
+def decompress_stream(file_path, dest_path, ext, checksums=False, progress=None):
+    """
+    Decompress a single .gz/.bz2/.xz stream to disk in fixed-size chunks
+
+    Runs in a worker process. Memory use is one chunk regardless of the
+    file size.
+
+    Args:
+        file_path (str): Compressed file path
+        dest_path (str): Output file path
+        ext (str): 'gz', 'bz2' or 'xz'
+        checksums (bool): Also compute SHA-256 of the output
+        progress (dict or None): Shared dict updated with 'percent'
+
+    Returns:
+        dict: Manifest entry for the written file
+    """
+    total = os.path.getsize(file_path) or 1
+    digest = MemberDigest(sha256=checksums)
+    
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(file_path, 'rb') as raw, STREAM_OPENERS[ext](raw, 'rb') as src, open(dest_path, 'wb') as dst:
+        last_percent = -1
+        while True:
+            chunk = src.read(EXTRACT_CHUNK_SIZE)
+            if not chunk:
+                break
+            dst.write(chunk)
+            digest.update(chunk)
+            
+            # Progress follows the compressed input position
+            percent = min(int(raw.tell() * 100 / total), 100)
+            if progress is not None and percent != last_percent:
+                progress['percent'] = percent
+                last_percent = percent
+    
+    return digest.entry(dest_path)
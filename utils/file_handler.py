@@ -1,86 +1,278 @@
 import os
+import stat
 import zipfile
 import rarfile
-import py7zr
 import tarfile
+import py7zr
 import shutil
 import random
 from pathlib import Path
+from concurrent.futures.process import BrokenProcessPool
 from utils.helpers import get_file_extension, is_archive_file, progress_bar, format_size
+from utils.worker_pool import run_in_pool, run_in_pool_with_progress
+from utils.sevenzip import extract_7z
+from utils.backends import get_backend, run_native_backend
+from utils.member_writer import safe_member_path, write_member
+from utils.decompress import STREAM_OPENERS, TAR_ALIASES, is_compressed_tar, decompressed_name, decompress_stream
+from utils.manifest import scan_directory, unique_entries
+from utils.member_filter import member_matches, select_members
+from config import JOB_MEMORY_LIMIT_BYTES, MAX_NESTED_DEPTH, MAX_NESTED_TOTAL_BYTES, EXTRACT_CHUNK_SIZE
 
 
-async def download_file(client, message, progress_callback=None):
+def _extract_sync(file_path, password, extract_dir, ext, members=None, checksums=False, member_filter=None):
     """
-    Download file from message with unique naming
-    Returns: (file_path, file_size, file_name)
+    Synchronous extraction logic to run in a worker process
+    
+    Returns: list of manifest entries for the written files
     """
-    if not message.document and not message.video and not message.audio:
-        return None, None, None
+    # Members are copied one chunk at a time so memory stays bounded
+    # no matter how large a single member is
+    manifest = []
+    if ext == 'zip':
+        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            if password:
+                zip_ref.setpassword(password.encode('utf-8'))
+            for info in zip_ref.infolist():
+                if info.is_dir() or (members is not None and info.filename not in members):
+                    continue
+                dest_path = safe_member_path(extract_dir, info.filename)
+                if dest_path:
+                    with zip_ref.open(info) as src:
+                        manifest.append(write_member(src, dest_path, checksums))
     
-    file = message.document or message.video or message.audio
-    file_name = getattr(file, 'file_name', f'file_{message.id}')
-    file_size = file.file_size
+    elif ext == 'rar':
+        with rarfile.RarFile(file_path, 'r') as rar_ref:
+            if password:
+                rar_ref.setpassword(password)
+            for info in rar_ref.infolist():
+                if not info.is_file() or (members is not None and info.filename not in members):
+                    continue
+                dest_path = safe_member_path(extract_dir, info.filename)
+                if dest_path:
+                    with rar_ref.open(info) as src:
+                        manifest.append(write_member(src, dest_path, checksums))
     
-    # Create downloads directory if not exists
-    os.makedirs('downloads', exist_ok=True)
+    elif ext in ['tar', 'gz', 'bz2', 'xz']:
+        with tarfile.open(file_path, 'r:*') as tar_ref:
+            for member in tar_ref:
+                if not member.isfile() or (members is not None and member.name not in members):
+                    continue
+                # Tar has no index, so filtered members are skipped while streaming
+                if not member_matches(member_filter, member.name, member.size):
+                    continue
+                dest_path = safe_member_path(extract_dir, member.name)
+                if dest_path:
+                    with tar_ref.extractfile(member) as src:
+                        manifest.append(write_member(src, dest_path, checksums))
     
-    # Generate unique filename: userid_random5digit_originalname
-    # Handle cases where from_user is None (e.g., channel posts)
-    user_id = message.from_user.id if (hasattr(message, 'from_user') and message.from_user) else message.chat.id
-    random_id = random.randint(10000, 99999)
-    unique_filename = f"{user_id}_{random_id}_{file_name}"
+    else:
+        raise ValueError(f"Unsupported archive format: .{ext}")
     
-    # Download file
-    file_path = await client.download_media(
-        message,
-        file_name=f"downloads/{unique_filename}",
-        progress=progress_callback
-    )
+    return unique_entries(manifest)
+
+
+async def run_python_extraction(file_path, password, extract_dir, ext, members=None, checksums=False,
+                                member_filter=None):
+    """
+    Extract with the built-in Python readers in worker processes
     
-    return file_path, file_size, file_name
+    Returns: list of manifest entries for the written files
+    """
+    if ext == '7z':
+        # Independent folders are decoded in parallel
+        return unique_entries(await extract_7z(file_path, password, extract_dir, members, checksums))
+    return await run_in_pool(_extract_sync, file_path, password, extract_dir, ext, members, checksums, member_filter)
 
 
-async def extract_archive(file_path, password=None):
+async def _extract_into(file_path, password, extract_dir, ext, members=None, progress=None, cancel_check=None,
+                        file_name=None, checksums=False, member_filter=None):
     """
-    Extract archive file to a shorter path to avoid Windows path limits
-    Returns: (success: bool, extracted_dir: str, error_msg: str)
+    Run one archive through the selected extraction backend
+    
+    Returns: list of manifest entries for the written files
     """
-    import asyncio
-    from concurrent.futures import ThreadPoolExecutor
-    
-    def _extract_sync(file_path, password, extract_dir, ext):
-        """Synchronous extraction logic to run in thread"""
-        # Extract based on file type
-        if ext == 'zip':
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                if password:
-                    zip_ref.setpassword(password.encode('utf-8'))
-                zip_ref.extractall(extract_dir)
-        
-        elif ext == 'rar':
-            with rarfile.RarFile(file_path, 'r') as rar_ref:
-                if password:
-                    rar_ref.setpassword(password)
-                rar_ref.extractall(extract_dir)
-        
-        elif ext == '7z':
-            # 7z requires password as string, not bytes
+    # Plain data.csv.gz style files are streamed out without tar
+    if ext in STREAM_OPENERS or ext in TAR_ALIASES:
+        if not is_compressed_tar(file_path, ext):
+            output_name = decompressed_name(file_name or os.path.basename(file_path))
+            if not member_matches(member_filter, output_name):
+                return []
+            dest_path = os.path.join(extract_dir, output_name)
+            entry = await run_in_pool_with_progress(decompress_stream, progress, file_path, dest_path, ext, checksums)
+            return [entry]
+        ext = TAR_ALIASES.get(ext, ext)
+    
+    # Filters are resolved against the archive index, so skipped members
+    # are never decompressed
+    if member_filter and members is None and ext in ['zip', 'rar', '7z']:
+        members = await run_in_pool(select_members, file_path, password, ext, member_filter)
+        if not members:
+            return []
+    
+    # Use the fastest native tool picked at startup, else Python readers.
+    # Member names come from the archive, so selections never reach a tool's
+    # command line (unrar would also read them as wildcards); they, filtered
+    # tar streams and encrypted archives (the password would sit on argv)
+    # stay in Python
+    backend = get_backend(ext)
+    if member_filter or members is not None or password:
+        backend = None
+    if backend:
+        # Tools need the destination to exist (nested folders don't yet)
+        os.makedirs(extract_dir, exist_ok=True)
+        try:
+            await run_native_backend(
+                backend, file_path, extract_dir, members,
+                progress=progress, cancel_check=cancel_check
+            )
+            # Native tools write on their own, so the tree is listed once afterwards
+            return await run_in_pool(scan_directory, extract_dir, checksums)
+        except RuntimeError as e:
+            # Cancellations and password errors are final. Anything else
+            # (bsdtar exits 1 on a single ../ member) gets a clean retry in
+            # Python, which skips unsafe members instead of failing the job
+            if (cancel_check and cancel_check()) or 'password' in str(e).lower():
+                raise
+            print(f"{backend} failed on {os.path.basename(file_path)}, retrying in Python: {e}")
+            shutil.rmtree(extract_dir, ignore_errors=True)
+            os.makedirs(extract_dir, exist_ok=True)
+    
+    # Run extraction in worker processes to avoid blocking
+    return await run_python_extraction(file_path, password, extract_dir, ext, members, checksums, member_filter)
+
+
+def _regular_files(directory):
+    """
+    Yield the regular files under a directory
+
+    Native tools recreate symlinks stored in the archive; following one
+    would open or measure a file elsewhere on the host.
+    """
+    for root, dirs, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            info = os.lstat(path)
+            if stat.S_ISREG(info.st_mode):
+                yield path, info.st_size
+
+
+def _directory_size(directory):
+    """Total size of all files under a directory (runs in a worker)"""
+    return sum(size for _, size in _regular_files(directory))
+
+
+def _find_archives(directory):
+    """Paths of the archives anywhere under a directory (runs in a worker)"""
+    return [path for path, _ in _regular_files(directory) if is_archive_file(path)]
+
+
+def _declared_size(file_path, password, ext, limit):
+    """
+    Uncompressed size of an archive, known before anything is written (runs in a worker)
+
+    Zip, RAR, 7z and plain tar sizes come from the index. Compressed
+    streams have no reliable index, so they are decompressed and counted
+    without being written, stopping as soon as the count passes limit.
+
+    Returns:
+        int: Size in bytes (anything over limit means "too big")
+    """
+    ext = TAR_ALIASES.get(ext, ext)
+    if ext == 'zip':
+        with zipfile.ZipFile(file_path) as zip_ref:
+            return sum(info.file_size for info in zip_ref.infolist())
+    if ext == 'rar':
+        with rarfile.RarFile(file_path) as rar_ref:
             if password:
-                with py7zr.SevenZipFile(file_path, mode='r', password=password) as sz_ref:
-                    sz_ref.extractall(extract_dir)
-            else:
-                with py7zr.SevenZipFile(file_path, mode='r') as sz_ref:
-                    sz_ref.extractall(extract_dir)
+                rar_ref.setpassword(password)
+            return sum(info.file_size for info in rar_ref.infolist())
+    if ext == '7z':
+        with py7zr.SevenZipFile(file_path, mode='r', password=password or None) as sz_ref:
+            return sum(f.uncompressed for f in sz_ref.files if not f.is_directory)
+    if ext == 'tar':
+        with tarfile.open(file_path, 'r:') as tar_ref:
+            return sum(member.size for member in tar_ref if member.isfile())
+    if ext in STREAM_OPENERS:
+        total = 0
+        with STREAM_OPENERS[ext](file_path, 'rb') as f:
+            while total <= limit:
+                chunk = f.read(EXTRACT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+        return total
+    raise ValueError(f"Unsupported archive format: .{ext}")
+
+
+async def _extract_nested(directory, password, depth, size_budget, cancel_check=None, member_filter=None):
+    """
+    Extract archives found inside an extracted tree, in place
+    
+    Each nested archive is extracted next to itself (``data.zip`` ->
+    ``data/``) in the same workspace and then removed. Its uncompressed
+    size is checked against the remaining budget before anything is
+    written, so a nested bomb never reaches the disk. Archives that fail
+    to extract, or that are reached after the depth or size limit, are left
+    untouched and delivered as regular files.
+    
+    Returns:
+        int: Remaining size budget in bytes
+    """
+    if depth > MAX_NESTED_DEPTH:
+        return size_budget
+    
+    nested_archives = await run_in_pool(_find_archives, directory)
+    
+    for nested_path in nested_archives:
+        if size_budget <= 0 or (cancel_check and cancel_check()):
+            break
         
-        elif ext in ['tar', 'gz', 'bz2']:
-            with tarfile.open(file_path, 'r:*') as tar_ref:
-                tar_ref.extractall(extract_dir)
+        nested_dir = nested_path.rsplit('.', 1)[0]
+        while os.path.exists(nested_dir):
+            nested_dir += '_'
         
-        else:
-            raise ValueError(f"Unsupported archive format: .{ext}")
+        archive_size = os.path.getsize(nested_path)
+        ext = get_file_extension(nested_path)
+        try:
+            if await run_in_pool(_declared_size, nested_path, password, ext, size_budget) > size_budget:
+                continue
+            await _extract_into(
+                nested_path, password, nested_dir, ext,
+                cancel_check=cancel_check, member_filter=member_filter
+            )
+        except Exception:
+            shutil.rmtree(nested_dir, ignore_errors=True)
+            continue
+        
+        os.remove(nested_path)
+        size_budget -= await run_in_pool(_directory_size, nested_dir) - archive_size
+        size_budget = await _extract_nested(nested_dir, password, depth + 1, size_budget, cancel_check, member_filter)
+    
+    return size_budget
+
+
+async def extract_archive(file_path, password=None, members=None, progress=None, cancel_check=None,
+                          recursive=False, file_name=None, checksums=False, member_filter=None):
+    """
+    Extract archive file to a shorter path to avoid Windows path limits
     
+    Args:
+        file_path (str): Downloaded archive path
+        password (str or None): Archive password
+        members (set or None): Member names to extract, None for all
+        progress (dict or None): Shared dict updated with extraction progress
+        cancel_check (callable or None): Returns True when the user cancelled
+        recursive (bool): Also extract archives found inside the archive
+        file_name (str or None): Original file name, used to name single-file output
+        checksums (bool): Also compute SHA-256 of every extracted file
+        member_filter (dict or None): Include/exclude globs and size bounds
+    
+    Returns: (success: bool, extracted_dir: str, manifest: list, error_msg: str)
+        manifest entries are dicts with 'path', 'size', 'crc32', 'sha256'
+        and 'type', built while the files were written
+    """
     try:
-        file_name = os.path.basename(file_path)
+        file_name = file_name or os.path.basename(file_path)
         ext = get_file_extension(file_name)
         
         # Create extraction directory with VERY short path to avoid Windows 260 char limit
@@ -89,76 +281,86 @@ async def extract_archive(file_path, password=None):
         extract_dir = f"downloads/ext_{random_id}"
         os.makedirs(extract_dir, exist_ok=True)
         
-        # Run extraction in thread executor to avoid blocking
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            await loop.run_in_executor(
-                executor,
-                _extract_sync,
-                file_path,
-                password,
-                extract_dir,
-                ext
-            )
+        # In recursive mode the filter applies to the files inside nested
+        # archives, so archives themselves are always extracted
+        outer_filter = member_filter
+        if recursive and member_filter:
+            outer_filter = dict(member_filter, keep_archives=True)
+        
+        manifest = await _extract_into(
+            file_path, password, extract_dir, ext, members,
+            progress=progress, cancel_check=cancel_check, file_name=file_name, checksums=checksums,
+            member_filter=outer_filter
+        )
+        
+        # Nested archives are extracted in the same workspace
+        if recursive and any(is_archive_file(entry['path']) for entry in manifest):
+            await _extract_nested(extract_dir, password, 1, MAX_NESTED_TOTAL_BYTES, cancel_check, outer_filter)
+            manifest = await run_in_pool(scan_directory, extract_dir, checksums)
+            
+            # Archives left unopened (too big, too deep, broken) are only
+            # delivered when they match the filter themselves
+            if member_filter:
+                kept = []
+                for entry in manifest:
+                    name = os.path.relpath(entry['path'], extract_dir)
+                    if is_archive_file(name) and not member_matches(member_filter, name, entry['size']):
+                        os.remove(entry['path'])
+                    else:
+                        kept.append(entry)
+                manifest = kept
         
         # Check if extraction was successful
-        if not os.listdir(extract_dir):
-            return False, None, "Archive is empty or extraction failed"
+        if not manifest:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+            if member_filter:
+                return False, None, None, "❌ No files in this archive match your filters.\n\nCheck them in /settings → 🎯 File Filters"
+            return False, None, None, "Archive is empty or extraction failed"
         
-        return True, extract_dir, None
+        return True, extract_dir, manifest, None
+    
+    except MemoryError:
+        return False, None, None, (
+            f"❌ This archive needs more than {format_size(JOB_MEMORY_LIMIT_BYTES)} of memory to extract.\n\n"
+            "It was stopped to keep the bot running for everyone. "
+            "Try re-compressing it with a smaller dictionary size or splitting it into parts."
+        )
+    
+    except BrokenProcessPool:
+        return False, None, None, "❌ The extraction worker stopped unexpectedly. Please try again."
     
     except zipfile.BadZipFile:
-        return False, None, "❌ File is corrupted or not a valid ZIP file"
+        return False, None, None, "❌ File is corrupted or not a valid ZIP file"
     
     except NotImplementedError as e:
         # Unsupported compression method
         error_msg = str(e).lower()
         if 'compression' in error_msg:
-            return False, None, (
+            return False, None, None, (
                 "❌ This ZIP file uses an advanced compression method that isn't supported.\n\n"
                 "Try:\n"
                 "• Re-compress the file using standard ZIP compression\n"
                 "• Use 7-Zip format instead (.7z)\n"
                 "• Extract manually and upload the files"
             )
-        return False, None, f"❌ Unsupported feature: {str(e)}"
+        return False, None, None, f"❌ Unsupported feature: {str(e)}"
     
     except ValueError as e:
         # Unsupported format from _extract_sync
-        return False, None, str(e)
+        return False, None, None, str(e)
     
     except RuntimeError as e:
         error_str = str(e).lower()
         if 'password' in error_str or 'encrypted' in error_str or 'bad password' in error_str:
-            return False, None, f"❌ Incorrect password or password required\n\nError: {str(e)}"
-        return False, None, f"❌ Extraction error: {str(e)}"
+            return False, None, None, f"❌ Incorrect password or password required\n\nError: {str(e)}"
+        return False, None, None, f"❌ Extraction error: {str(e)}"
     
     except Exception as e:
         error_str = str(e).lower()
         # Show actual error for debugging
         if 'password' in error_str:
-            return False, None, f"❌ Password error: {str(e)}"
-        return False, None, f"❌ Error: {str(e)}"
-
-
-async def get_all_files(directory, max_files=50):
-    """
-    Get all files from directory recursively
-    Returns: list of file paths
-    """
-    files = []
-    for root, dirs, filenames in os.walk(directory):
-        for filename in filenames:
-            file_path = os.path.join(root, filename)
-            files.append(file_path)
-            
-            if len(files) >= max_files:
-                break
-        
-        if len(files) >= max_files:
-            break
-    
-    return files
+            return False, None, None, f"❌ Password error: {str(e)}"
+        return False, None, None, f"❌ Error: {str(e)}"
 
 
 async def cleanup_files(paths):
@@ -1,5 +1,7 @@
 import os
 import re
+from bisect import bisect_left
+from functools import lru_cache
 
 
 def parse_replacement_rules(rules_string):
@@ -33,6 +35,36 @@ def parse_replacement_rules(rules_string):
     return rules
 
 
+@lru_cache(maxsize=256)
+def compile_replacement_rules(rules_string):
+    """
+    Compile pipe-separated rules into one single-pass matcher
+    
+    All rules become one alternation regex, so text is scanned once no
+    matter how many rules there are. Results are cached by rules string,
+    so filenames and captions of a whole job share one compiled matcher.
+    Where two rules match at the same position, the earlier rule wins.
+    
+    Args:
+        rules_string (str): Pipe-separated rules
+    
+    Returns:
+        tuple or None: (compiled pattern, {old: new}) or None if there are no rules
+    """
+    mapping = {}
+    for rule in parse_replacement_rules(rules_string):
+        old = rule.get("remove", rule.get("old"))
+        # Empty patterns would match between every character
+        if old and old not in mapping:
+            mapping[old] = "" if "remove" in rule else rule["new"]
+    
+    if not mapping:
+        return None
+    
+    pattern = re.compile("|".join(re.escape(old) for old in mapping))
+    return pattern, mapping
+
+
 def apply_replacements(text, rules_string):
     """
     Apply word replacements and removals to text
@@ -47,18 +79,12 @@ def apply_replacements(text, rules_string):
     if not text or not rules_string:
         return text
     
-    rules = parse_replacement_rules(rules_string)
-    result = text
-    
-    for rule in rules:
-        if "remove" in rule:
-            # Remove all occurrences
-            result = result.replace(rule["remove"], "")
-        else:
-            # Replace old with new
-            result = result.replace(rule["old"], rule["new"])
+    compiled = compile_replacement_rules(rules_string)
+    if not compiled:
+        return text
     
-    return result
+    pattern, mapping = compiled
+    return pattern.sub(lambda match: mapping[match.group(0)], text)
 
 
 def add_prefix_suffix(filename, prefix, suffix):
@@ -131,6 +157,56 @@ def transform_filename(filename, settings):
     return result
 
 
+def unique_names(names):
+    """
+    Number repeated names so every name in a batch is distinct
+    
+    Names are compared case-insensitively; later duplicates become
+    "name (2).ext", "name (3).ext" and so on.
+    
+    Args:
+        names (list): Names in delivery order
+    
+    Returns:
+        list: Distinct names in the same order
+    """
+    used = set()
+    result = []
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        candidate = name
+        number = 2
+        while candidate.lower() in used:
+            candidate = f"{stem} ({number}){ext}"
+            number += 1
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def plan_upload_names(paths, settings):
+    """
+    Work out the upload name of every extracted file in one go
+    
+    Files on disk keep their extracted names; the planned name is only
+    passed to Telegram as the file name. Files from different folders
+    that end up with the same name get numbered.
+    
+    Args:
+        paths (list): Extracted file paths in delivery order
+        settings (dict): User settings dict
+    
+    Returns:
+        dict: path -> upload name
+    """
+    names = unique_names([transform_filename(os.path.basename(path), settings) for path in paths])
+    return dict(zip(paths, names))
+
+
+# Variables usable in caption templates
+CAPTION_VARIABLES = re.compile(r'\{(filename|size|extension|caption)\}')
+
+
 def substitute_caption_variables(template, file_info):
     """
     Replace variables in caption template with actual values
@@ -151,15 +227,109 @@ def substitute_caption_variables(template, file_info):
     if not template:
         return None
     
-    result = template
+    # One pass, so a value that happens to contain "{size}" isn't expanded again
+    return CAPTION_VARIABLES.sub(lambda match: file_info.get(match.group(1), ''), template)
+
+
+def utf16_length(text):
+    """Length of text in UTF-16 code units, the unit Telegram entity offsets use"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def compile_caption_template(template, entities=None, rules_string=None):
+    """
+    Compile a caption template once per job for cheap per-file rendering
+    
+    The template is cut into literal and variable segments at every
+    variable and every formatting entity boundary. Each entity then
+    covers a run of whole segments, so its offsets can be recomputed
+    for any variable values. Caption replacements are applied to the
+    literal segments here, and to variable values when rendering.
     
-    # Replace each variable
-    result = result.replace('{filename}', file_info.get('filename', ''))
-    result = result.replace('{size}', file_info.get('size', ''))
-    result = result.replace('{extension}', file_info.get('extension', ''))
-    result = result.replace('{caption}', file_info.get('caption', ''))
+    Args:
+        template (str): Caption template with variables
+        entities (list or None): Stored entity dicts with UTF-16 'offset'/'length'
+        rules_string (str or None): Pipe-separated caption replacement rules
     
-    return result
+    Returns:
+        dict or None: Compiled template for render_caption(), None without a template
+    """
+    if not template:
+        return None
+    
+    # UTF-16 offset of every character boundary, to map entity offsets to indexes
+    units = [0]
+    for char in template:
+        units.append(units[-1] + (2 if ord(char) > 0xFFFF else 1))
+    
+    variables = {match.start(): (match.end(), match.group(1)) for match in CAPTION_VARIABLES.finditer(template)}
+    
+    def boundary(offset, at_end):
+        index = bisect_left(units, offset)
+        # Entities never split a variable: widen to cover all of it
+        for start, (end, _) in variables.items():
+            if start < index < end:
+                return end if at_end else start
+        return min(index, len(template))
+    
+    spans = []
+    cuts = {0, len(template)}
+    for entity in entities or []:
+        start = boundary(entity['offset'], False)
+        end = boundary(entity['offset'] + entity['length'], True)
+        if start < end:
+            spans.append((start, end, entity))
+            cuts.update((start, end))
+    for start, (end, _) in variables.items():
+        cuts.update((start, end))
+    cuts = sorted(cuts)
+    
+    segments = []
+    segment_at = {}
+    for start, end in zip(cuts, cuts[1:]):
+        segment_at[start] = len(segments)
+        if start in variables:
+            segments.append(('variable', variables[start][1], None))
+        else:
+            text = apply_replacements(template[start:end], rules_string)
+            segments.append(('text', text, utf16_length(text)))
+    segment_at[len(template)] = len(segments)
+    
+    return {
+        'segments': segments,
+        'entities': [(segment_at[start], segment_at[end], entity) for start, end, entity in spans],
+        'rules': rules_string,
+    }
+
+
+def render_caption(compiled, file_info):
+    """
+    Render a compiled caption template for one file
+    
+    Args:
+        compiled (dict): Result of compile_caption_template()
+        file_info (dict): Dict with 'filename', 'size', 'extension', 'caption' keys
+    
+    Returns:
+        tuple: (caption, entity dicts with offsets shifted for this caption)
+    """
+    parts = []
+    offsets = [0]
+    for kind, value, length in compiled['segments']:
+        if kind == 'variable':
+            value = apply_replacements(file_info.get(value, ''), compiled['rules'])
+            length = utf16_length(value)
+        parts.append(value)
+        offsets.append(offsets[-1] + length)
+    
+    entities = []
+    for first, last, entity in compiled['entities']:
+        offset = offsets[first]
+        length = offsets[last] - offset
+        if length > 0:
+            entities.append({**entity, 'offset': offset, 'length': length})
+    
+    return ''.join(parts), entities
 
 
 def get_file_type(filename):
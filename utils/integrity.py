@@ -0,0 +1,179 @@
+import os
+import zlib
+import lzma
+import tarfile
+import zipfile
+import rarfile
+from config import EXTRACT_CHUNK_SIZE
+from utils.worker_pool import run_in_pool_with_progress
+from utils.sevenzip import test_7z
+from utils.decompress import STREAM_OPENERS, TAR_ALIASES, is_compressed_tar, decompressed_name
+
+
+# Errors that mean the member data itself is damaged
+ZIP_DATA_ERRORS = (zipfile.BadZipFile, zlib.error, lzma.LZMAError, EOFError, OSError)
+STREAM_DATA_ERRORS = (tarfile.TarError, zlib.error, lzma.LZMAError, EOFError, OSError)
+
+
+def _new_report():
+    """Empty integrity report"""
+    return {'members': 0, 'bytes': 0, 'corrupt': [], 'unchecked': 0}
+
+
+def _drain(src):
+    """Read a member stream to the end, letting the reader verify its CRC"""
+    size = 0
+    while True:
+        chunk = src.read(EXTRACT_CHUNK_SIZE)
+        if not chunk:
+            return size
+        size += len(chunk)
+
+
+def _set_percent(progress, done, total):
+    """Store progress as a percentage in the shared dict"""
+    if progress is not None and total:
+        progress['percent'] = min(int(done * 100 / total), 100)
+
+
+def _test_zip(file_path, password, report, progress):
+    """Read every zip member through its decoder and check CRCs"""
+    with zipfile.ZipFile(file_path, 'r') as zip_ref:
+        if password:
+            zip_ref.setpassword(password.encode('utf-8'))
+        infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+        total = sum(info.compress_size for info in infos)
+        done = 0
+        for info in infos:
+            try:
+                with zip_ref.open(info) as src:
+                    report['bytes'] += _drain(src)
+                report['members'] += 1
+            except NotImplementedError:
+                report['unchecked'] += 1  # Compression method not supported here
+            except ZIP_DATA_ERRORS as e:
+                report['corrupt'].append((info.filename, str(e)))
+            done += info.compress_size
+            _set_percent(progress, done, total)
+
+
+def _test_rar(file_path, password, report, progress):
+    """Read every RAR member and let rarfile check CRCs"""
+    with rarfile.RarFile(file_path, 'r') as rar_ref:
+        if password:
+            rar_ref.setpassword(password)
+        infos = [info for info in rar_ref.infolist() if info.is_file()]
+        total = sum(info.compress_size for info in infos)
+        done = 0
+        for info in infos:
+            try:
+                with rar_ref.open(info) as src:
+                    report['bytes'] += _drain(src)
+                report['members'] += 1
+            except (rarfile.RarCannotExec, rarfile.RarWrongPassword, rarfile.PasswordRequired):
+                raise
+            except rarfile.Error as e:
+                report['corrupt'].append((info.filename, str(e) or type(e).__name__))
+            done += info.compress_size
+            _set_percent(progress, done, total)
+
+
+def _test_tar(file_path, report, progress):
+    """Read a (compressed) tar stream through to its trailer"""
+    total = os.path.getsize(file_path)
+    with open(file_path, 'rb') as raw:
+        name = '(archive header)'
+        try:
+            with tarfile.open(fileobj=raw, mode='r:*') as tar_ref:
+                for member in tar_ref:
+                    if not member.isfile():
+                        continue
+                    name = member.name
+                    with tar_ref.extractfile(member) as src:
+                        report['bytes'] += _drain(src)
+                    report['members'] += 1
+                    name = '(after ' + member.name + ')'
+                    _set_percent(progress, raw.tell(), total)
+                
+                # Read past the end-of-archive blocks so gzip/xz/bz2 check
+                # their trailing CRC as well
+                _drain(tar_ref.fileobj)
+        except STREAM_DATA_ERRORS as e:
+            # The compressed stream is shared by all members, so nothing
+            # after the damaged point can be read
+            report['corrupt'].append((name, str(e) or type(e).__name__))
+
+
+def _test_stream(file_path, ext, file_name, report, progress):
+    """Decompress a single .gz/.bz2/.xz stream and check its trailer"""
+    total = os.path.getsize(file_path)
+    with open(file_path, 'rb') as raw:
+        try:
+            with STREAM_OPENERS[ext](raw, 'rb') as src:
+                while True:
+                    chunk = src.read(EXTRACT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    report['bytes'] += len(chunk)
+                    _set_percent(progress, raw.tell(), total)
+            report['members'] += 1
+        except STREAM_DATA_ERRORS as e:
+            report['corrupt'].append((decompressed_name(file_name), str(e) or type(e).__name__))
+
+
+def test_members(file_path, password, ext, file_name, progress=None):
+    """
+    Stream every member through its decoder and check CRCs (runs in a worker)
+
+    Decoded data is discarded chunk by chunk, nothing is written to disk.
+
+    Args:
+        file_path (str): Archive path
+        password (str or None): Archive password
+        ext (str): Archive format
+        file_name (str): Original file name, used for single-file reports
+        progress (dict or None): Shared dict updated with 'percent'
+
+    Returns:
+        dict: {'members', 'bytes', 'corrupt': [(name, reason)], 'unchecked'}
+    """
+    report = _new_report()
+
+    if ext == 'zip':
+        _test_zip(file_path, password, report, progress)
+    elif ext == 'rar':
+        _test_rar(file_path, password, report, progress)
+    elif ext in STREAM_OPENERS or ext in TAR_ALIASES:
+        if is_compressed_tar(file_path, ext):
+            _test_tar(file_path, report, progress)
+        else:
+            _test_stream(file_path, ext, file_name, report, progress)
+    elif ext == 'tar':
+        _test_tar(file_path, report, progress)
+    else:
+        raise ValueError(f"Unsupported archive format: .{ext}")
+
+    return report
+
+
+async def test_archive(file_path, password=None, ext=None, file_name=None, progress=None):
+    """
+    Verify an archive's integrity without extracting it
+
+    Args:
+        file_path (str): Downloaded archive path
+        password (str or None): Archive password
+        ext (str or None): Archive format, taken from file_name when omitted
+        file_name (str or None): Original file name
+        progress (dict or None): Shared dict updated with test progress
+
+    Returns:
+        dict: {'members', 'bytes', 'corrupt': [(name, reason)], 'unchecked'}
+    """
+    file_name = file_name or os.path.basename(file_path)
+    ext = ext or file_name.rsplit('.', 1)[-1].lower()
+
+    if ext == '7z':
+        return await test_7z(file_path, password)
+
+    return await run_in_pool_with_progress(test_members, progress, file_path, password, ext, file_name)
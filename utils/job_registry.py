@@ -0,0 +1,110 @@
+import asyncio
+
+
+# Jobs in flight, keyed by what they produce: identical requests share one job
+_jobs = {}
+
+# Cleanups waiting for abandoned jobs, referenced so they aren't garbage collected
+_background = set()
+
+
+def join_job(key, start, cleanup=None):
+    """
+    Subscribe to the job for a key, starting it if nobody else has
+
+    The first caller starts the work, later callers with the same key get
+    the same job. The job's result stays on disk until the last subscriber
+    leaves, then cleanup(result) removes it.
+
+    Args:
+        key (tuple): What the job produces, e.g. ('download', file_unique_id)
+        start (callable): start(job) -> coroutine doing the work. It should
+            write its progress into job['progress'] and stop once
+            job['refs'] drops to 0
+        cleanup (callable or None): Async cleanup(result) for the job's output
+
+    Returns:
+        dict: The job, with 'key', 'task', 'refs', 'progress' and 'shared'
+    """
+    job = _jobs.get(key)
+    if job is None:
+        job = {'key': key, 'refs': 0, 'progress': {}, 'cleanup': cleanup, 'shared': False}
+        job['task'] = asyncio.ensure_future(start(job))
+        _jobs[key] = job
+    else:
+        job['shared'] = True
+    job['refs'] += 1
+    return job
+
+
+async def wait_job(job, cancel_check=None, on_progress=None):
+    """
+    Wait for a job's result as one of its subscribers
+
+    The job itself is never cancelled from here: a subscriber that gives
+    up just stops waiting and leaves the work to the others.
+
+    Args:
+        job (dict): Job from join_job()
+        cancel_check (callable or None): Returns True when this subscriber cancelled
+        on_progress (callable or None): Async on_progress(progress) called every second
+
+    Returns:
+        The result of the job's coroutine (its exception is raised instead)
+    """
+    while not job['task'].done():
+        if cancel_check and cancel_check():
+            raise Exception("Process cancelled by user")
+        if on_progress:
+            await on_progress(job['progress'])
+        await asyncio.wait([job['task']], timeout=1)
+    return job['task'].result()
+
+
+def claim_job(job):
+    """
+    Take a job's output for yourself if you are its only subscriber
+
+    A claimed job is no longer offered to new requests, so its owner may
+    delete files from the output as they are sent.
+
+    Returns:
+        bool: True if the job is now exclusively yours
+    """
+    if job['refs'] != 1:
+        return False
+    if _jobs.get(job['key']) is job:
+        del _jobs[job['key']]
+    return True
+
+
+async def leave_job(job):
+    """
+    Drop a subscription; the last subscriber to leave cleans up
+
+    A job still running when everyone left sees refs == 0 and stops on its
+    own; its output is cleaned up once it returns.
+    """
+    job['refs'] -= 1
+    if job['refs'] > 0:
+        return
+    if _jobs.get(job['key']) is job:
+        del _jobs[job['key']]
+
+    async def cleanup_when_done():
+        try:
+            result = await job['task']
+        except BaseException:
+            return
+        if job['cleanup'] and result is not None:
+            try:
+                await job['cleanup'](result)
+            except Exception as e:
+                print(f"Error cleaning up job {job['key']}: {e}")
+
+    if job['task'].done():
+        await cleanup_when_done()
+    else:
+        task = asyncio.ensure_future(cleanup_when_done())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
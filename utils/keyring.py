@@ -0,0 +1,66 @@
+import json
+import base64
+import hashlib
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+from config import KEYRING_SECRET, MAX_KEYRING_PASSWORDS
+
+
+def _get_key():
+    """Derive the AES-256 key used for all keyrings"""
+    return hashlib.sha256(f"unzip-bot-keyring:{KEYRING_SECRET}".encode('utf-8')).digest()
+
+
+def encrypt_keyring(passwords):
+    """
+    Encrypt a list of passwords for storage in user settings
+
+    Args:
+        passwords (list): Plain-text passwords
+
+    Returns:
+        str or None: base64(nonce + tag + ciphertext), None for an empty list
+    """
+    if not passwords:
+        return None
+
+    cipher = AES.new(_get_key(), AES.MODE_GCM, nonce=get_random_bytes(12))
+    ciphertext, tag = cipher.encrypt_and_digest(json.dumps(passwords).encode('utf-8'))
+    return base64.b64encode(cipher.nonce + tag + ciphertext).decode('ascii')
+
+
+def decrypt_keyring(blob):
+    """
+    Decrypt a stored keyring
+
+    Returns:
+        list: Plain-text passwords (empty if unset or unreadable)
+    """
+    if not blob:
+        return []
+
+    try:
+        raw = base64.b64decode(blob)
+        nonce, tag, ciphertext = raw[:12], raw[12:28], raw[28:]
+        cipher = AES.new(_get_key(), AES.MODE_GCM, nonce=nonce)
+        return json.loads(cipher.decrypt_and_verify(ciphertext, tag).decode('utf-8'))
+    except (ValueError, KeyError):
+        # Wrong secret or tampered data
+        return []
+
+
+def get_keyring_passwords(settings):
+    """Get the decrypted keyring from a user settings dict"""
+    return decrypt_keyring(settings.get('password_keyring'))
+
+
+def add_keyring_password(settings, password):
+    """
+    Add a password to the keyring (most recent first)
+
+    Returns:
+        str or None: New encrypted keyring to save in user settings
+    """
+    passwords = [p for p in get_keyring_passwords(settings) if p != password]
+    passwords.insert(0, password)
+    return encrypt_keyring(passwords[:MAX_KEYRING_PASSWORDS])
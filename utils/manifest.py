@@ -0,0 +1,116 @@
+import os
+import stat
+import zlib
+import hashlib
+from config import EXTRACT_CHUNK_SIZE
+from utils.filename_transformer import get_file_type
+
+
+class MemberDigest:
+    """Running size, CRC-32 and optional SHA-256 of one member as it is written"""
+
+    def __init__(self, sha256=False):
+        self.size = 0
+        self.crc32 = 0
+        self._sha256 = hashlib.sha256() if sha256 else None
+
+    def update(self, chunk):
+        self.size += len(chunk)
+        self.crc32 = zlib.crc32(chunk, self.crc32)
+        if self._sha256 is not None:
+            self._sha256.update(chunk)
+
+    def entry(self, path):
+        """Build the manifest entry for the member written to path"""
+        return manifest_entry(
+            path,
+            self.size,
+            self.crc32,
+            self._sha256.hexdigest() if self._sha256 is not None else None
+        )
+
+
+def manifest_entry(path, size, crc32=None, sha256=None):
+    """
+    Build one manifest entry
+
+    Args:
+        path (str): Path of the extracted file on disk
+        size (int): File size in bytes
+        crc32 (int or None): CRC-32 of the contents
+        sha256 (str or None): Hex SHA-256 of the contents
+
+    Returns:
+        dict: {'path', 'size', 'crc32', 'sha256', 'type'}
+    """
+    return {
+        'path': path,
+        'size': size,
+        'crc32': crc32,
+        'sha256': sha256,
+        'type': get_file_type(path)
+    }
+
+
+def unique_entries(entries):
+    """Drop earlier entries for paths that a later member overwrote"""
+    return list({entry['path']: entry for entry in entries}.values())
+
+
+def scan_directory(directory, checksums=False):
+    """
+    Build a manifest by walking an extracted tree (runs in a worker)
+
+    Used when files were written by a native tool or rearranged by nested
+    extraction, so they couldn't be hashed while being written. Only
+    regular files are listed: native tools recreate symlinks stored in the
+    archive, and uploading one would send whatever it points to.
+
+    Args:
+        directory (str): Extraction directory
+        checksums (bool): Also read every file to compute CRC-32 and SHA-256
+
+    Returns:
+        list: Manifest entries
+    """
+    entries = []
+    for root, dirs, filenames in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            info = os.lstat(path)
+            if not stat.S_ISREG(info.st_mode):
+                continue
+            if not checksums:
+                entries.append(manifest_entry(path, info.st_size))
+                continue
+
+            digest = MemberDigest(sha256=True)
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(EXTRACT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+            entries.append(digest.entry(path))
+    return entries
+
+
+def checksum_file_text(manifest, extract_dir):
+    """
+    Render a manifest as a checksum file
+
+    SHA-256 lines use the ``sha256sum -c`` format; members without a
+    SHA-256 fall back to SFV style CRC-32 lines.
+
+    Returns:
+        str: File contents
+    """
+    lines = []
+    for entry in manifest:
+        name = os.path.relpath(entry['path'], extract_dir).replace(os.sep, '/')
+        if entry['sha256']:
+            lines.append(f"{entry['sha256']}  {name}")
+        elif entry['crc32'] is not None:
+            lines.append(f"{name} {entry['crc32']:08x}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,147 @@
+import io
+import os
+from PIL import Image, UnidentifiedImageError
+from config import PHOTO_MAX_BYTES, PHOTO_MAX_SIDE_SUM, PHOTO_MAX_RATIO, PHOTO_DOWNSCALE_SIDE
+from utils.filename_transformer import get_file_type
+from utils.mp4 import probe_mp4
+
+
+# Container signatures Telegram can play as video: (offset, magic)
+VIDEO_SIGNATURES = [
+    (4, b'ftyp'),                # MP4, MOV, M4V
+    (0, b'\x1a\x45\xdf\xa3'),    # Matroska, WebM
+    (0, b'FLV'),                 # FLV
+    (0, b'\x30\x26\xb2\x75'),    # ASF / WMV
+]
+
+
+def probe_image(path):
+    """
+    Read an image's format and dimensions from its header
+
+    Pillow only parses the header on open, no pixels are decoded.
+
+    Returns:
+        dict or None: {'format', 'width', 'height', 'animated'}, None if not an image
+    """
+    try:
+        with Image.open(path) as img:
+            return {
+                'format': img.format,
+                'width': img.width,
+                'height': img.height,
+                'animated': getattr(img, 'is_animated', False),
+            }
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def sniff_video(path):
+    """Check the first bytes of a file for a known video container"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        return False
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return True
+    return any(head[offset:offset + len(magic)] == magic for offset, magic in VIDEO_SIGNATURES)
+
+
+def document_route():
+    """Route for a file sent as a plain document"""
+    return {'type': 'document', 'downscale': False, 'width': 0, 'height': 0, 'duration': 0, 'faststart': False}
+
+
+def route_media(path, name):
+    """
+    Decide how a file is sent in media mode, before any upload is attempted
+
+    Telegram rejects photos over 10 MB, with width + height over 10000 or
+    with an aspect ratio over 20. Too large photos are marked for
+    downscaling; ones that can't be fixed go out as documents. MP4/MOV
+    videos get their duration and size from the atoms, and are marked for
+    faststart when moov sits after the media data.
+
+    Args:
+        path (str): File on disk
+        name (str): Name the file is uploaded under
+
+    Returns:
+        dict: {'type': 'photo'|'video'|'document', 'downscale', 'width', 'height', 'duration', 'faststart'}
+    """
+    route = document_route()
+    file_type = get_file_type(name)
+
+    if file_type == 'photo':
+        info = probe_image(path)
+        if not info or info['animated'] or not info['width'] or not info['height']:
+            return route
+        width, height = info['width'], info['height']
+        if max(width, height) / min(width, height) > PHOTO_MAX_RATIO:
+            return route
+        route.update(type='photo', width=width, height=height)
+        route['downscale'] = (
+            os.path.getsize(path) > PHOTO_MAX_BYTES or width + height > PHOTO_MAX_SIDE_SUM
+        )
+    elif file_type == 'video' and sniff_video(path):
+        route['type'] = 'video'
+        info = probe_mp4(path)
+        if info:
+            route.update(info)
+
+    return route
+
+
+def route_media_files(files):
+    """
+    Route a batch of files in one go (runs in a worker)
+
+    Args:
+        files (list): (path, name) tuples
+
+    Returns:
+        list: route_media() result for every file
+    """
+    return [route_media(path, name) for path, name in files]
+
+
+def downscale_image(path, dest_path=None):
+    """
+    Shrink a photo to fit Telegram's photo limits (runs in a worker)
+
+    The longest side is scaled to PHOTO_DOWNSCALE_SIDE, the largest size
+    Telegram shows a photo at, and the result is saved as JPEG. JPEGs are
+    decoded at reduced scale, so big photos never decode at full size.
+    The photo is replaced in place unless dest_path is given.
+
+    Returns:
+        int: New file size in bytes
+    """
+    with Image.open(path) as img:
+        scale = min(1.0, PHOTO_DOWNSCALE_SIDE / max(img.width, img.height))
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img.draft('RGB', size)
+
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # Flatten transparency onto white instead of black
+            rgba = img.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            image = img.convert('RGB')
+
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+
+    data = b''
+    for quality in (90, 80, 70, 60):
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True)
+        data = buffer.getvalue()
+        if len(data) <= PHOTO_MAX_BYTES:
+            break
+
+    with open(dest_path or path, 'wb') as f:
+        f.write(data)
+    return len(data)
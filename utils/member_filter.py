@@ -0,0 +1,148 @@
+import re
+import zipfile
+import fnmatch
+import rarfile
+import py7zr
+from utils.helpers import is_archive_file
+
+
+# Size units accepted in the settings menu ("10MB", "1.5 GB", "500k")
+SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+              'g': 1024 ** 3, 'gb': 1024 ** 3}
+
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$', re.IGNORECASE)
+
+
+def parse_patterns(text):
+    """Split a comma separated pattern list ("*.mp4, __MACOSX/")"""
+    return [pattern.strip() for pattern in (text or '').split(',') if pattern.strip()]
+
+
+def parse_size(text):
+    """
+    Parse a human size like "10MB" into bytes
+
+    Returns:
+        int or None: Size in bytes, None for an empty value
+
+    Raises:
+        ValueError: If the text is not a valid size
+    """
+    if not text or not text.strip():
+        return None
+    match = SIZE_PATTERN.match(text)
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def parse_size_range(text):
+    """
+    Parse a size range like "10MB-2GB", "10MB-" or "-500MB"
+
+    Returns:
+        tuple: (min_size or None, max_size or None)
+    """
+    if '-' not in text:
+        return parse_size(text), None
+    low, high = text.split('-', 1)
+    return parse_size(low), parse_size(high)
+
+
+def build_member_filter(settings):
+    """
+    Get the member filter from user settings
+
+    Returns:
+        dict or None: Picklable filter for the workers, None when no filter is set
+    """
+    member_filter = {
+        'include': parse_patterns(settings.get('include_patterns')),
+        'exclude': parse_patterns(settings.get('exclude_patterns')),
+        'min_size': settings.get('min_member_size'),
+        'max_size': settings.get('max_member_size'),
+    }
+    if not any(member_filter.values()):
+        return None
+    return member_filter
+
+
+def _pattern_matches(pattern, name):
+    """Match a glob against a member path, its file name or (for "dir/") its folders"""
+    if pattern.endswith('/'):
+        folder = pattern.rstrip('/')
+        return any(fnmatch.fnmatch(part, folder) for part in name.split('/')[:-1])
+    if '/' in pattern:
+        return fnmatch.fnmatch(name, pattern)
+    return fnmatch.fnmatch(name.rsplit('/', 1)[-1], pattern)
+
+
+def member_matches(member_filter, name, size=None):
+    """
+    Check whether a member passes the user's filter
+
+    Args:
+        member_filter (dict or None): Filter from build_member_filter
+        name (str): Member path inside the archive
+        size (int or None): Uncompressed size, None when unknown
+
+    Returns:
+        bool: True if the member should be extracted
+    """
+    if not member_filter:
+        return True
+
+    name = name.replace('\\', '/')
+    # In recursive mode archives are opened and the filter applies to what's inside
+    if member_filter.get('keep_archives') and is_archive_file(name):
+        return True
+
+    lowered = name.lower()
+    if member_filter['include'] and not any(
+        _pattern_matches(pattern.lower(), lowered) for pattern in member_filter['include']
+    ):
+        return False
+    if any(_pattern_matches(pattern.lower(), lowered) for pattern in member_filter['exclude']):
+        return False
+
+    if size is not None:
+        if member_filter['min_size'] is not None and size < member_filter['min_size']:
+            return False
+        if member_filter['max_size'] is not None and size > member_filter['max_size']:
+            return False
+    return True
+
+
+def select_members(file_path, password, ext, member_filter):
+    """
+    Pick the members to extract from the archive index (runs in a worker)
+
+    Only headers are read, so filtered members are never decompressed.
+
+    Returns:
+        set: Member names that pass the filter
+    """
+    if ext == 'zip':
+        with zipfile.ZipFile(file_path) as zip_ref:
+            return {
+                info.filename for info in zip_ref.infolist()
+                if not info.is_dir() and member_matches(member_filter, info.filename, info.file_size)
+            }
+
+    if ext == 'rar':
+        with rarfile.RarFile(file_path) as rar_ref:
+            if password:
+                rar_ref.setpassword(password)
+            return {
+                info.filename for info in rar_ref.infolist()
+                if info.is_file() and member_matches(member_filter, info.filename, info.file_size)
+            }
+
+    if ext == '7z':
+        with py7zr.SevenZipFile(file_path, mode='r', password=password or None) as sz_ref:
+            return {
+                f.filename for f in sz_ref.files
+                if not f.is_directory and member_matches(member_filter, f.filename, f.uncompressed)
+            }
+
+    raise ValueError(f"Archive index can't be read for .{ext}")
@@ -0,0 +1,50 @@
+import os
+from config import EXTRACT_CHUNK_SIZE
+from utils.manifest import MemberDigest
+
+
+def safe_member_path(extract_dir, name):
+    """
+    Build the output path of an archive member inside extract_dir
+
+    Absolute paths, drive letters and '..' components are dropped so a
+    member can never be written outside the extraction directory.
+
+    Returns:
+        str or None: Output path, or None if nothing is left of the name
+    """
+    parts = [
+        part for part in name.replace('\\', '/').split('/')
+        if part not in ('', '.', '..') and not part.endswith(':')
+    ]
+    if not parts:
+        return None
+    return os.path.join(extract_dir, *parts)
+
+
+def write_member(src, dest_path, checksums=False):
+    """
+    Copy an archive member stream to disk in fixed-size chunks
+
+    The size and CRC-32 (plus SHA-256 if asked) are computed from the same
+    chunks, so the file never has to be read back.
+
+    Args:
+        src: Readable binary stream of the member
+        dest_path (str): Output file path
+        checksums (bool): Also compute SHA-256
+
+    Returns:
+        dict: Manifest entry for the written file
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+    digest = MemberDigest(sha256=checksums)
+    with open(dest_path, 'wb') as dst:
+        while True:
+            chunk = src.read(EXTRACT_CHUNK_SIZE)
+            if not chunk:
+                break
+            dst.write(chunk)
+            digest.update(chunk)
+    return digest.entry(dest_path)
@@ -0,0 +1,263 @@
+import io
+import os
+import struct
+
+
+# Atoms whose children are walked while looking for metadata and chunk offsets
+CONTAINER_ATOMS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# Larger moov atoms aren't loaded into memory (typical ones are a few MB)
+MOOV_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _read_atoms(f, start, end):
+    """
+    List the atoms between two offsets of an open file
+
+    Only the 8/16 byte headers are read, so listing a multi-GB file costs
+    a handful of seeks.
+
+    Returns:
+        list: (type, offset, size, header_size) tuples
+    """
+    atoms = []
+    pos = start
+    while end - pos >= 8:
+        f.seek(pos)
+        size, kind = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            break
+        atoms.append((kind, pos, size, header))
+        pos += size
+    return atoms
+
+
+def _iter_boxes(data, start, end):
+    """Yield (type, offset, size, header_size) for the atoms inside a buffer"""
+    pos = start
+    while end - pos >= 8:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos, size, header
+        pos += size
+
+
+def _walk(data, start, end, path=()):
+    """Yield (path, type, offset, size, header_size) for every atom in the moov tree"""
+    for kind, offset, size, header in _iter_boxes(data, start, end):
+        yield path, kind, offset, size, header
+        if kind in CONTAINER_ATOMS:
+            yield from _walk(data, offset + header, offset + size, path + (kind,))
+
+
+def _movie_info(moov):
+    """Duration (seconds) and video track dimensions from a moov atom"""
+    duration = 0
+    width = height = 0
+
+    for kind, offset, size, header in _iter_boxes(moov, 0, len(moov)):
+        if kind == b'mvhd':
+            body = offset + header
+            if moov[body] == 1:
+                timescale, length = struct.unpack_from('>IQ', moov, body + 20)
+            else:
+                timescale, length = struct.unpack_from('>II', moov, body + 12)
+            if timescale:
+                duration = round(length / timescale)
+
+        elif kind == b'trak' and not width:
+            handler = None
+            track_size = None
+            for path, child, child_offset, child_size, child_header in _walk(moov, offset + header, offset + size):
+                if child == b'hdlr' and path == (b'mdia',):
+                    handler = moov[child_offset + child_header + 8:child_offset + child_header + 12]
+                elif child == b'tkhd' and not path:
+                    # Width and height are the last two 16.16 fixed-point fields
+                    w, h = struct.unpack_from('>II', moov, child_offset + child_size - 8)
+                    track_size = (w >> 16, h >> 16)
+                    # A 90/270 degree rotation matrix means the picture is shown sideways
+                    body = child_offset + child_header
+                    matrix = body + (52 if moov[body] == 1 else 40)
+                    a, b = struct.unpack_from('>ii', moov, matrix)
+                    if a == 0 and b != 0:
+                        track_size = track_size[::-1]
+            if handler == b'vide' and track_size:
+                width, height = track_size
+
+    return duration, width, height
+
+
+def _find_moov(path):
+    """Top-level atoms of a file and its moov atom, or None if it isn't an MP4/MOV"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        atoms = _read_atoms(f, 0, file_size)
+    moov = next((atom for atom in atoms if atom[0] == b'moov'), None)
+    if moov is None or moov[2] > MOOV_MAX_BYTES:
+        return atoms, None
+    return atoms, moov
+
+
+def probe_mp4(path):
+    """
+    Read duration and dimensions of an MP4/MOV from its atoms
+
+    Returns:
+        dict or None: {'duration', 'width', 'height', 'faststart'}, where
+        faststart means moov sits after the media data and must be moved
+        to the front for the video to stream
+    """
+    try:
+        atoms, moov = _find_moov(path)
+        if moov is None:
+            return None
+        with open(path, 'rb') as f:
+            f.seek(moov[1] + moov[3])
+            duration, width, height = _movie_info(f.read(moov[2] - moov[3]))
+    except (OSError, struct.error, IndexError):
+        return None
+
+    return {
+        'duration': duration,
+        'width': width,
+        'height': height,
+        'faststart': any(kind == b'mdat' and offset < moov[1] for kind, offset, _, _ in atoms),
+    }
+
+
+def faststart_segments(path):
+    """
+    Plan a faststart layout of an MP4 with moov before the media data (runs in a worker)
+
+    Nothing is rewritten on disk: the result lists byte ranges of the
+    original file plus the patched moov atom, in upload order. Chunk
+    offsets (stco/co64) pointing past the insertion point are moved by
+    the size of moov.
+
+    Returns:
+        list or None: (offset, length) ranges and bytes objects, or None
+        if the file can't be remuxed
+    """
+    try:
+        atoms, moov = _find_moov(path)
+    except (OSError, struct.error):
+        return None
+    if moov is None:
+        return None
+
+    moov_offset, moov_size = moov[1], moov[2]
+    insert_at = next((offset for kind, offset, _, _ in atoms if kind == b'mdat'), None)
+    if insert_at is None or insert_at > moov_offset:
+        return None
+
+    with open(path, 'rb') as f:
+        f.seek(moov_offset)
+        data = bytearray(f.read(moov_size))
+
+    def shifted(value):
+        return value + moov_size if insert_at <= value < moov_offset else value
+
+    try:
+        for _, kind, offset, size, header in _walk(data, moov[3], moov_size, (b'moov',)):
+            if kind not in (b'stco', b'co64'):
+                continue
+            count = struct.unpack_from('>I', data, offset + header + 4)[0]
+            entry_format = '>I' if kind == b'stco' else '>Q'
+            entry_size = struct.calcsize(entry_format)
+            table = offset + header + 8
+            if table + count * entry_size > offset + size:
+                return None
+            for index in range(count):
+                position = table + index * entry_size
+                value = shifted(struct.unpack_from(entry_format, data, position)[0])
+                if kind == b'stco' and value > 0xFFFFFFFF:
+                    # Would need a co64 upgrade, which changes moov's size again
+                    return None
+                struct.pack_into(entry_format, data, position, value)
+    except struct.error:
+        return None
+
+    file_size = os.path.getsize(path)
+    segments = [(0, insert_at), bytes(data), (insert_at, moov_offset - insert_at)]
+    if moov_offset + moov_size < file_size:
+        segments.append((moov_offset + moov_size, file_size - moov_offset - moov_size))
+    return [segment for segment in segments if not isinstance(segment, tuple) or segment[1]]
+
+
+class SegmentStream(io.RawIOBase):
+    """
+    Read-only stream that joins file byte ranges and in-memory blocks
+
+    Used to upload a faststart MP4 straight from the extracted file: the
+    patched moov comes from memory and everything else from disk.
+    """
+
+    def __init__(self, path, segments, name):
+        self.name = name
+        self._file = open(path, 'rb')
+        self._segments = []
+        start = 0
+        for segment in segments:
+            length = len(segment) if isinstance(segment, (bytes, bytearray)) else segment[1]
+            self._segments.append((start, length, segment))
+            start += length
+        self._length = start
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._length
+        self._pos = max(0, min(offset, self._length))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, buffer):
+        # Fill the whole buffer across segment boundaries: upload parts
+        # must be full-sized except the last one
+        view = memoryview(buffer)
+        filled = 0
+        for start, length, segment in self._segments:
+            if filled == len(view) or self._pos >= self._length:
+                break
+            if not start <= self._pos < start + length:
+                continue
+            skip = self._pos - start
+            size = min(len(view) - filled, length - skip)
+            if isinstance(segment, (bytes, bytearray)):
+                view[filled:filled + size] = segment[skip:skip + size]
+            else:
+                self._file.seek(segment[0] + skip)
+                size = self._file.readinto(view[filled:filled + size])
+                if not size:
+                    break
+            filled += size
+            self._pos += size
+        return filled
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
@@ -0,0 +1,239 @@
+import zlib
+import lzma
+import asyncio
+import zipfile
+import hashlib
+import rarfile
+import py7zr
+from py7zr.io import Py7zIO, WriterFactory
+from py7zr.properties import CompressionMethod
+from utils.worker_pool import run_in_pool
+
+
+# Members are only decoded up to this many bytes to test a password
+CHECK_BYTES = 4 * 1024 * 1024  # 4 MB
+
+# Encryption flag bit in zip member headers
+ZIP_FLAG_ENCRYPTED = 0x1
+
+
+class _CheckDone(Exception):
+    """Raised by the 7z check writer once enough bytes decoded cleanly"""
+
+
+class _CappedWriter(Py7zIO):
+    """Discards decoded data and stops the decoder after CHECK_BYTES"""
+
+    def __init__(self):
+        self._size = 0
+
+    def write(self, s):
+        self._size += len(s)
+        if self._size >= CHECK_BYTES:
+            raise _CheckDone()
+        return len(s)
+
+    def read(self, size=None):
+        return b''
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return self._size
+
+
+class _CappedWriterFactory(WriterFactory):
+    def create(self, filename):
+        return _CappedWriter()
+
+
+def archive_is_encrypted(file_path, ext):
+    """
+    Check whether an archive needs a password (runs in a worker)
+
+    Returns:
+        bool: True if the headers or any member are encrypted
+    """
+    try:
+        if ext == 'zip':
+            with zipfile.ZipFile(file_path) as zip_ref:
+                return any(info.flag_bits & ZIP_FLAG_ENCRYPTED for info in zip_ref.infolist())
+
+        if ext == 'rar':
+            with rarfile.RarFile(file_path) as rar_ref:
+                return rar_ref.needs_password()
+
+        if ext == '7z':
+            with py7zr.SevenZipFile(file_path, mode='r') as sz_ref:
+                return sz_ref.needs_password()
+    except (py7zr.exceptions.PasswordRequired, rarfile.PasswordRequired):
+        # Encrypted headers can't even be listed without a password
+        return True
+    except Exception:
+        # Let the extraction step report broken archives
+        return False
+
+    return False
+
+
+def _check_zip_password(file_path, password):
+    """Test a password on the smallest encrypted zip member"""
+    with zipfile.ZipFile(file_path) as zip_ref:
+        encrypted = [info for info in zip_ref.infolist() if info.flag_bits & ZIP_FLAG_ENCRYPTED]
+        if not encrypted:
+            return True
+
+        info = min(encrypted, key=lambda i: i.compress_size)
+        try:
+            # Opening checks the ZipCrypto check byte (1/256 false positive),
+            # reading the member then confirms it through inflate and CRC-32
+            with zip_ref.open(info, pwd=password.encode('utf-8')) as member:
+                remaining = CHECK_BYTES
+                while remaining > 0:
+                    chunk = member.read(min(remaining, 256 * 1024))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+            return True
+        except NotImplementedError:
+            return None  # AES or unsupported method: can't verify here
+        except (RuntimeError, zipfile.BadZipFile, zlib.error, lzma.LZMAError, EOFError, ValueError, OSError):
+            return False
+
+
+def _check_7z_password(file_path, password):
+    """Test a password on the 7z header or the first member of the smallest folder"""
+    try:
+        with py7zr.SevenZipFile(file_path, mode='r', password=password) as sz_ref:
+            streams = sz_ref.header.main_streams
+            if streams is None:
+                return True
+
+            encrypted = [
+                folder for folder in streams.unpackinfo.folders
+                if any(coder['method'] == CompressionMethod.CRYPT_AES256_SHA256 for coder in folder.coders)
+            ]
+            if not encrypted:
+                return True
+
+            smallest = min(encrypted, key=lambda folder: folder.get_unpack_size())
+            target = next(
+                (f.filename for f in sz_ref.files if f.folder is smallest and not f.emptystream),
+                None
+            )
+            if target is None:
+                return True
+
+            try:
+                sz_ref.extract(targets=[target], factory=_CappedWriterFactory())
+            except _CheckDone:
+                pass
+            return True
+    except _CheckDone:
+        return True
+    except Exception:
+        # Wrong keys decrypt to garbage: encrypted headers fail to parse and
+        # member data fails in the decoder or on CRC
+        return False
+
+
+def _check_rar5_value(password, file_encryption):
+    """Verify a RAR5 member's stored password check value (no decoding)"""
+    kdf_shift, salt, check_value = file_encryption[2], file_encryption[3], file_encryption[5]
+    if len(check_value) != 12 or kdf_shift > rarfile.RAR_MAX_KDF_SHIFT:
+        return None
+
+    check, check_sum = check_value[:8], check_value[8:]
+    if hashlib.sha256(check).digest()[:4] != check_sum:
+        return None
+
+    pwd_hash = rarfile.rar5_s2k(password, salt, (1 << kdf_shift) + 32)
+    pwd_check = bytearray(8)
+    for i, v in enumerate(pwd_hash):
+        pwd_check[i & 7] ^= v
+    return bytes(pwd_check) == check
+
+
+def _check_rar_password(file_path, password):
+    """Test a password on the RAR header, the RAR5 check value or the smallest member"""
+    try:
+        # With encrypted headers rarfile verifies the password while parsing
+        rar_ref = rarfile.RarFile(file_path)
+        rar_ref.setpassword(password)
+    except rarfile.Error:
+        return False
+
+    with rar_ref:
+        encrypted = [info for info in rar_ref.infolist() if info.is_file() and info.needs_password()]
+        if not encrypted:
+            return True
+
+        info = min(encrypted, key=lambda i: i.compress_size)
+        file_encryption = getattr(info, 'file_encryption', None)
+        if file_encryption and file_encryption[5]:
+            result = _check_rar5_value(password, file_encryption)
+            if result is not None:
+                return result
+
+        # RAR3 has no check value: decode the start of the smallest member
+        try:
+            with rar_ref.open(info) as member:
+                member.read(CHECK_BYTES)
+            return True
+        except rarfile.RarCannotExec:
+            return None
+        except rarfile.Error:
+            return False
+
+
+def check_password(file_path, ext, password):
+    """
+    Cheaply test one password without extracting the archive (runs in a worker)
+
+    Returns:
+        bool or None: True/False, or None when it can't be verified cheaply
+    """
+    if ext == 'zip':
+        return _check_zip_password(file_path, password)
+    if ext == '7z':
+        return _check_7z_password(file_path, password)
+    if ext == 'rar':
+        return _check_rar_password(file_path, password)
+    return True
+
+
+async def find_password(file_path, ext, candidates):
+    """
+    Try several candidate passwords concurrently in the worker pool
+
+    Args:
+        file_path (str): Archive path
+        ext (str): Archive format
+        candidates (list): Passwords in order of preference
+
+    Returns:
+        tuple: (password or None, verified: bool) - verified is False when
+        no candidate could be checked cheaply and the first unverifiable one
+        is returned to be tried by the full extraction
+    """
+    if not candidates:
+        return None, False
+
+    results = await asyncio.gather(*[
+        run_in_pool(check_password, file_path, ext, password)
+        for password in candidates
+    ], return_exceptions=True)
+
+    for password, result in zip(candidates, results):
+        if result is True:
+            return password, True
+
+    for password, result in zip(candidates, results):
+        if result is None or isinstance(result, BaseException):
+            return password, False
+
+    return None, True
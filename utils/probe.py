@@ -0,0 +1,190 @@
+import zlib
+import struct
+import tarfile
+from utils.decompress import TAR_ALIASES
+
+
+# Telegram serves files in 1 MiB chunks
+CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes of each format
+SIGNATURES = [
+    ('7z', b'7z\xbc\xaf\x27\x1c'),
+    ('rar', b'Rar!\x1a\x07'),
+    ('zip', b'PK\x03\x04'),
+    ('zip', b'PK\x05\x06'),  # Empty archive
+    ('zip', b'PK\x07\x08'),  # Spanned archive marker
+    ('xz', b'\xfd7zXZ\x00'),
+    ('gz', b'\x1f\x8b'),
+    ('bz2', b'BZh'),
+]
+
+FORMAT_NAMES = {
+    'zip': 'ZIP', 'rar': 'RAR', '7z': '7-Zip', 'tar': 'TAR',
+    'gz': 'GZIP', 'bz2': 'BZIP2', 'xz': 'XZ',
+}
+
+ZIP_EOCD_SIGNATURE = b'PK\x05\x06'
+ZIP_EOCD_SIZE = 22
+ZIP_CENTRAL_SIGNATURE = b'PK\x01\x02'
+ZIP_MAX_COMMENT = 0xFFFF
+
+SEVENZIP_HEADER_SIZE = 32
+
+
+def detect_format(head):
+    """
+    Detect the archive format from its first bytes
+
+    Returns:
+        str or None: 'zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz' or None
+    """
+    for ext, signature in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+
+    if len(head) >= tarfile.BLOCKSIZE:
+        try:
+            tarfile.TarInfo.frombuf(head[:tarfile.BLOCKSIZE], tarfile.ENCODING, 'surrogateescape')
+            return 'tar'
+        except tarfile.HeaderError:
+            pass
+    return None
+
+
+def _check_zip_tail(tail, file_size):
+    """Find the end of central directory record and check it fits the file"""
+    search_from = max(0, len(tail) - ZIP_EOCD_SIZE - ZIP_MAX_COMMENT)
+    pos = tail.rfind(ZIP_EOCD_SIGNATURE, search_from)
+    if pos < 0 or len(tail) - pos < ZIP_EOCD_SIZE:
+        return False
+
+    cd_size, cd_offset = struct.unpack('<II', tail[pos + 12:pos + 20])
+    if cd_size == 0xFFFFFFFF or cd_offset == 0xFFFFFFFF:
+        return True  # Zip64 - the real values live in another record
+
+    eocd_offset = file_size - len(tail) + pos
+    # Data prepended to the archive shifts every offset by the same amount
+    shift = eocd_offset - cd_size - cd_offset
+    if shift < 0:
+        return False
+
+    cd_start = pos - cd_size
+    if cd_size and cd_start >= 0:
+        return tail[cd_start:cd_start + 4] == ZIP_CENTRAL_SIGNATURE
+    return True
+
+
+def _check_7z_header(head, tail, file_size):
+    """Check the start header CRC and that the next header lies inside the file"""
+    if len(head) < SEVENZIP_HEADER_SIZE:
+        return False
+
+    start_crc, = struct.unpack('<I', head[8:12])
+    if zlib.crc32(head[12:32]) != start_crc:
+        return False
+
+    next_offset, next_size, next_crc = struct.unpack('<QQI', head[12:32])
+    header_start = SEVENZIP_HEADER_SIZE + next_offset
+    if header_start + next_size > file_size:
+        return False
+
+    # The header usually sits at the very end: verify it when we have it
+    tail_start = file_size - len(tail)
+    if header_start >= tail_start:
+        block = tail[header_start - tail_start:header_start - tail_start + next_size]
+        return zlib.crc32(block) == next_crc
+    return True
+
+
+def _check_xz_tail(tail):
+    """An xz stream ends with the 'YZ' footer magic (before optional zero padding)"""
+    stripped = tail.rstrip(b'\x00')
+    return stripped.endswith(b'YZ')
+
+
+def probe_archive(head, tail, file_size, ext, file_name):
+    """
+    Check an upload from its first and last bytes
+
+    Args:
+        head (bytes): Start of the file
+        tail (bytes): End of the file
+        file_size (int): Full file size in bytes
+        ext (str): Extension the file was uploaded with
+        file_name (str): Original file name
+
+    Returns:
+        str or None: Error message if the job can't succeed, else None
+    """
+    expected = TAR_ALIASES.get(ext, ext)
+    actual = detect_format(head)
+
+    # Zip readers accept data prepended to the archive (e.g. stubs)
+    if actual is None and expected == 'zip' and _check_zip_tail(tail, file_size):
+        actual = 'zip'
+
+    if actual is None:
+        return (
+            f"❌ **Not a Valid Archive**\n\n"
+            f"`{file_name}` doesn't start like a {FORMAT_NAMES.get(expected, expected.upper())} file.\n"
+            f"It may be corrupted or not an archive at all."
+        )
+
+    # tarfile opens compressed tar streams named .tar just fine
+    if expected == 'tar' and actual in ['gz', 'bz2', 'xz']:
+        return None
+
+    if actual != expected:
+        return (
+            f"❌ **Wrong File Extension**\n\n"
+            f"`{file_name}` is named `.{ext}` but is actually a {FORMAT_NAMES[actual]} file.\n"
+            f"Rename it to `.{actual}` and send it again."
+        )
+
+    complete = True
+    if expected == 'zip':
+        complete = _check_zip_tail(tail, file_size)
+    elif expected == '7z':
+        complete = _check_7z_header(head, tail, file_size)
+    elif expected == 'xz':
+        complete = _check_xz_tail(tail)
+    elif expected == 'tar':
+        complete = file_size % tarfile.BLOCKSIZE == 0
+
+    if not complete:
+        return (
+            f"❌ **Incomplete Archive**\n\n"
+            f"The end of `{file_name}` is missing or damaged - the upload was probably cut off.\n"
+            f"Please upload the complete file again."
+        )
+    return None
+
+
+async def probe_download(client, message, file_size, ext, file_name):
+    """
+    Fetch only the first and last chunks of a Telegram file and probe them
+
+    Takes a couple of seconds instead of the full download. Network errors
+    while probing never block the job - the normal download will report them.
+
+    Returns:
+        str or None: Error message if the job can't succeed, else None
+    """
+    chunks = -(-file_size // CHUNK_SIZE)
+    try:
+        if chunks <= 2:
+            head = b''.join([chunk async for chunk in client.stream_media(message)])
+            tail = head
+        else:
+            head = b''.join([chunk async for chunk in client.stream_media(message, limit=1)])
+            # Two chunks so the tail is at least 1 MiB even when the
+            # last chunk is only a few bytes long
+            tail = b''.join([chunk async for chunk in client.stream_media(message, limit=2, offset=-2)])
+    except Exception as e:
+        print(f"Archive probe skipped: {e}")
+        return None
+
+    if not head or not tail:
+        return None
+    return probe_archive(head, tail, file_size, ext, file_name)
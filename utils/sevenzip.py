@@ -0,0 +1,272 @@
+import os
+import asyncio
+import py7zr
+from py7zr.exceptions import CrcError
+from py7zr.io import Py7zIO, WriterFactory
+from config import MAX_WORKER_PROCESSES
+from utils.worker_pool import run_in_pool
+from utils.manifest import MemberDigest
+
+
+class MemberFileWriter(Py7zIO):
+    """Writes one decoded 7z member straight to its output file"""
+
+    def __init__(self, path, checksums=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.digest = MemberDigest(sha256=checksums)
+        self._file = open(path, 'wb')
+        self._size = 0
+
+    def write(self, s):
+        self._size += len(s)
+        self.digest.update(s)
+        return self._file.write(s)
+
+    def read(self, size=None):
+        return b''
+
+    def seek(self, offset, whence=0):
+        return self._size
+
+    def flush(self):
+        self._file.flush()
+
+    def size(self):
+        return self._size
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class MemberFileWriterFactory(WriterFactory):
+    """Creates a file writer per member so nothing is buffered in memory"""
+
+    def __init__(self, checksums=False):
+        self.checksums = checksums
+        self.writers = []
+
+    def create(self, filename):
+        writer = MemberFileWriter(filename, self.checksums)
+        self.writers.append(writer)
+        return writer
+
+    def close_all(self):
+        for writer in self.writers:
+            writer.close()
+
+    def manifest(self):
+        """Manifest entries of every member written so far"""
+        return [writer.digest.entry(writer.path) for writer in self.writers]
+
+
+class MemberCountingWriter(Py7zIO):
+    """Discards one decoded 7z member, keeping only its size"""
+
+    def __init__(self):
+        self._size = 0
+
+    def write(self, s):
+        self._size += len(s)
+        return len(s)
+
+    def read(self, size=None):
+        return b''
+
+    def seek(self, offset, whence=0):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return self._size
+
+
+class MemberCountingWriterFactory(WriterFactory):
+    """Tracks members in decode order without writing anything to disk"""
+
+    def __init__(self):
+        self.writers = {}
+
+    def create(self, filename):
+        writer = MemberCountingWriter()
+        self.writers[filename] = writer
+        return writer
+
+
+def _plan_folder_groups(file_path, password, members, max_groups):
+    """
+    Read the 7z header and split wanted members into per-worker groups
+
+    Members are grouped by the folder (solid block) that stores them so each
+    folder is decoded by exactly one worker. Folders holding no wanted member
+    are left out entirely.
+
+    Returns:
+        list: List of member name lists, one per worker task
+    """
+    with py7zr.SevenZipFile(file_path, mode='r', password=password) as sz_ref:
+        streams = sz_ref.header.main_streams
+        folders = streams.unpackinfo.folders if streams is not None else []
+        folder_index = {id(folder): idx for idx, folder in enumerate(folders)}
+
+        folder_targets = {}
+        loose_targets = []  # Directories and empty files live outside folders
+        for f in sz_ref.files:
+            if members is not None and f.filename not in members:
+                continue
+            if f.emptystream or f.folder is None:
+                loose_targets.append(f.filename)
+            else:
+                idx = folder_index[id(f.folder)]
+                folder_targets.setdefault(idx, []).append(f.filename)
+
+    if not folder_targets:
+        return [loose_targets] if loose_targets else []
+
+    # Longest-first onto the least loaded group keeps workers evenly busy
+    group_count = max(1, min(max_groups, len(folder_targets)))
+    groups = [[] for _ in range(group_count)]
+    loads = [0] * group_count
+    by_size = sorted(
+        folder_targets.items(),
+        key=lambda item: folders[item[0]].get_unpack_size(),
+        reverse=True
+    )
+    for idx, names in by_size:
+        target = loads.index(min(loads))
+        groups[target].extend(names)
+        loads[target] += folders[idx].get_unpack_size()
+
+    groups[0].extend(loose_targets)
+    return groups
+
+
+def _extract_folder_group(file_path, password, extract_dir, targets, checksums=False):
+    """
+    Decode only the folders holding the given members (runs in a worker)
+
+    Returns:
+        list: Manifest entries of the written members
+    """
+    factory = MemberFileWriterFactory(checksums)
+    try:
+        with py7zr.SevenZipFile(file_path, mode='r', password=password) as sz_ref:
+            sz_ref.extract(path=extract_dir, targets=targets, factory=factory)
+    finally:
+        factory.close_all()
+
+    # py7zr hands the writers absolute paths; manifests from every other
+    # reader use paths under extract_dir as given
+    root = os.path.abspath(extract_dir)
+    return [
+        dict(entry, path=os.path.join(extract_dir, os.path.relpath(entry['path'], root)))
+        for entry in factory.manifest()
+    ]
+
+
+async def extract_7z(file_path, password, extract_dir, members=None, checksums=False):
+    """
+    Extract a 7z archive by decoding independent folders in parallel
+
+    Args:
+        file_path (str): Archive path
+        password (str or None): Archive password
+        extract_dir (str): Destination directory
+        members (set or None): Member names to extract, None for all
+        checksums (bool): Also compute SHA-256 of every member
+
+    Returns:
+        list: Manifest entries of the written members
+    """
+    # 7z requires password as string, not bytes
+    groups = await run_in_pool(
+        _plan_folder_groups,
+        file_path,
+        password or None,
+        members,
+        MAX_WORKER_PROCESSES
+    )
+
+    # Wait for every worker before reporting, so none is left writing into
+    # a directory that is about to be cleaned up
+    results = await asyncio.gather(*[
+        run_in_pool(_extract_folder_group, file_path, password or None, extract_dir, targets, checksums)
+        for targets in groups if targets
+    ], return_exceptions=True)
+
+    manifest = []
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+        manifest.extend(result)
+    return manifest
+
+
+def _test_folder_group(file_path, password, targets):
+    """
+    Decode the given members and verify their CRCs (runs in a worker)
+
+    Returns:
+        dict: Integrity report for this group of members
+    """
+    report = {'members': 0, 'bytes': 0, 'corrupt': [], 'unchecked': 0}
+    factory = MemberCountingWriterFactory()
+    file_count = len(targets)
+    try:
+        with py7zr.SevenZipFile(file_path, mode='r', password=password) as sz_ref:
+            wanted = set(targets)
+            file_count = sum(1 for f in sz_ref.files if f.filename in wanted and not f.is_directory)
+            sz_ref.extract(targets=targets, factory=factory)
+        failed = None
+    except CrcError as e:
+        failed = (e.args[2], "CRC mismatch")
+    except Exception as e:
+        # A broken stream stops the decoder at the member being read
+        failed = (next(reversed(factory.writers), '(folder header)'), str(e) or type(e).__name__)
+
+    # py7zr raises on the first bad member: members created before it
+    # decoded fully, the ones after it in the group were never reached
+    for name, writer in factory.writers.items():
+        if failed and name == failed[0]:
+            break
+        report['members'] += 1
+        report['bytes'] += writer.size()
+
+    if failed:
+        report['corrupt'].append(failed)
+        report['unchecked'] = max(file_count - report['members'] - 1, 0)
+    return report
+
+
+async def test_7z(file_path, password):
+    """
+    Verify every member CRC of a 7z archive without writing to disk
+
+    Folders are decoded in parallel exactly like extract_7z.
+
+    Returns:
+        dict: {'members', 'bytes', 'corrupt': [(name, reason)], 'unchecked'}
+    """
+    groups = await run_in_pool(
+        _plan_folder_groups,
+        file_path,
+        password or None,
+        None,
+        MAX_WORKER_PROCESSES
+    )
+
+    reports = await asyncio.gather(*[
+        run_in_pool(_test_folder_group, file_path, password or None, targets)
+        for targets in groups if targets
+    ])
+
+    report = {'members': 0, 'bytes': 0, 'corrupt': [], 'unchecked': 0}
+    for group_report in reports:
+        report['members'] += group_report['members']
+        report['bytes'] += group_report['bytes']
+        report['corrupt'].extend(group_report['corrupt'])
+        report['unchecked'] += group_report['unchecked']
+    return report
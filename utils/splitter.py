@@ -0,0 +1,75 @@
+import io
+import os
+from config import UPLOAD_LIMIT_BYTES
+
+
+class FileSection(io.RawIOBase):
+    """
+    Read-only view of a byte range of a file
+
+    Pyrogram uploads any binary file object that has a ``name``, so each
+    part is read straight from the extracted file - nothing is copied.
+    """
+
+    def __init__(self, path, start, length, name):
+        self.name = name
+        self._file = open(path, 'rb')
+        self._start = start
+        self._length = length
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._length
+        self._pos = max(0, min(offset, self._length))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._length - self._pos)
+        if size <= 0:
+            return 0
+        self._file.seek(self._start + self._pos)
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._pos += read
+        return read
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+def split_sections(path, size, name, part_size=UPLOAD_LIMIT_BYTES):
+    """
+    Cut a file into upload-sized raw parts (name.001, name.002, ...)
+
+    Parts are plain byte ranges, so they can be joined with
+    ``cat name.0* > name``, ``copy /b`` or 7-Zip.
+
+    Args:
+        path (str): File on disk
+        size (int): File size in bytes
+        name (str): File name the parts are named after
+        part_size (int): Largest part size
+
+    Returns:
+        list: FileSection objects, one per part
+    """
+    part_count = -(-size // part_size)
+    digits = max(3, len(str(part_count)))
+    return [
+        FileSection(path, index * part_size, min(part_size, size - index * part_size),
+                    f"{name}.{index + 1:0{digits}d}")
+        for index in range(part_count)
+    ]
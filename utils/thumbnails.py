@@ -0,0 +1,250 @@
+import os
+import asyncio
+import hashlib
+from PIL import Image, ImageOps
+from pyrogram.file_id import FileId, FileUniqueId, FileUniqueType
+from config import (
+    THUMB_CACHE_DIR, THUMB_CACHE_MAX_BYTES, THUMB_SIDE,
+    AUTO_THUMB_BATCH, AUTO_THUMB_LOOKAHEAD, AUTO_THUMB_WAIT_SECONDS, AUTO_THUMB_MAX_SOURCE_BYTES
+)
+from utils.filename_transformer import get_file_type
+from utils.worker_pool import run_in_pool
+
+
+# Telegram ignores thumbnails over 200 KB
+THUMB_MAX_BYTES = 200 * 1024
+
+# One download per thumbnail even when several uploads ask for it at once:
+# path -> [lock, callers using or waiting for it]
+_locks = {}
+
+# Thumbnails held by running jobs (path -> count) are never evicted, and
+# ones invalidated while held are removed when the last job lets go
+_in_use = {}
+_stale = set()
+
+
+def thumbnail_key(file_id):
+    """
+    Cache key for a thumbnail: its file_unique_id
+
+    The unique id is derived from the stored file_id, so it is the same for
+    every file_id Telegram hands out for the same image.
+    """
+    try:
+        media_id = FileId.decode(file_id).media_id
+        return FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=media_id).encode()
+    except Exception:
+        return hashlib.sha1(file_id.encode('utf-8')).hexdigest()
+
+
+def _cache_path(file_id):
+    return os.path.join(THUMB_CACHE_DIR, f"{thumbnail_key(file_id)}.jpg")
+
+
+def make_thumbnail(src_path, dest_path):
+    """
+    Normalise an image into a Telegram thumbnail (runs in a worker)
+
+    The image is rotated upright, flattened onto white, fitted into
+    THUMB_SIDE x THUMB_SIDE and saved as a JPEG under 200 KB.
+    """
+    with Image.open(src_path) as img:
+        img.draft('RGB', (THUMB_SIDE, THUMB_SIDE))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            rgba = img.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            image = img.convert('RGB')
+
+    image.thumbnail((THUMB_SIDE, THUMB_SIDE), Image.LANCZOS)
+
+    temp_path = f"{dest_path}.tmp"
+    for quality in (85, 70, 50):
+        image.save(temp_path, 'JPEG', quality=quality, optimize=True)
+        if os.path.getsize(temp_path) <= THUMB_MAX_BYTES:
+            break
+    os.replace(temp_path, dest_path)
+
+
+def _evict():
+    """Drop least recently used thumbnails until the cache fits its budget"""
+    entries = []
+    for name in os.listdir(THUMB_CACHE_DIR):
+        path = os.path.join(THUMB_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= THUMB_CACHE_MAX_BYTES:
+            break
+        if path in _in_use:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+async def get_thumbnail(client, file_id):
+    """
+    Get a user's custom thumbnail as a local JPEG, downloading it only once
+
+    The thumbnail stays in the cache until release_thumbnail() is called
+    with the returned path.
+
+    Args:
+        client: Pyrogram client
+        file_id (str or None): Thumbnail file_id from the user's settings
+
+    Returns:
+        str or None: Path of the cached thumbnail, None if unset or unusable
+    """
+    if not file_id:
+        return None
+
+    path = _cache_path(file_id)
+    entry = _locks.setdefault(path, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            # Held before it is made, so the eviction that follows can't drop it
+            _in_use[path] = _in_use.get(path, 0) + 1
+            if not await _prepare(client, file_id, path):
+                release_thumbnail(path)
+                return None
+            _stale.discard(path)
+            return path
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _locks[path]
+
+
+async def _prepare(client, file_id, path):
+    """Make sure the thumbnail is in the cache, returning True if it is"""
+    if os.path.isfile(path):
+        # Touch it so the LRU keeps thumbnails that are in use
+        os.utime(path)
+        return True
+
+    os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+    download_path = None
+    try:
+        download_path = await client.download_media(file_id, file_name=f"{path}.src")
+        await run_in_pool(make_thumbnail, download_path, path)
+    except Exception as e:
+        print(f"Could not prepare thumbnail: {e}")
+        return False
+    finally:
+        if download_path and os.path.isfile(download_path):
+            os.remove(download_path)
+
+    _evict()
+    return os.path.isfile(path)
+
+
+def release_thumbnail(path):
+    """Let the cache evict a thumbnail from get_thumbnail() again"""
+    if not path or path not in _in_use:
+        return
+    _in_use[path] -= 1
+    if _in_use[path]:
+        return
+    del _in_use[path]
+    if path in _stale:
+        _stale.discard(path)
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def invalidate_thumbnail(file_id):
+    """Remove a thumbnail from the cache when the user replaces or removes it"""
+    if not file_id:
+        return
+    path = _cache_path(file_id)
+    if path in _in_use:
+        # A running job is still uploading with it
+        _stale.add(path)
+    else:
+        _remove(path)
+
+
+def make_thumbnails(items):
+    """
+    Thumbnail a batch of images in one worker job
+
+    Args:
+        items (list): (src_path, dest_path) tuples
+
+    Returns:
+        dict: src_path -> dest_path for every image that worked
+    """
+    done = {}
+    for src_path, dest_path in items:
+        try:
+            make_thumbnail(src_path, dest_path)
+            done[src_path] = dest_path
+        except Exception:
+            pass
+    return done
+
+
+class AutoThumbnails:
+    """
+    Preview thumbnails for extracted images, made a few uploads ahead
+
+    Images are thumbnailed in batches of AUTO_THUMB_BATCH in the worker
+    pool. At most AUTO_THUMB_LOOKAHEAD batches run ahead of the upload
+    loop, and an upload waits at most AUTO_THUMB_WAIT_SECONDS for its
+    thumbnail before going out without one, so thumbnailing never holds
+    the uploads back.
+    """
+
+    def __init__(self, entries, thumb_dir):
+        os.makedirs(thumb_dir, exist_ok=True)
+        images = [
+            entry['path'] for entry in entries
+            if get_file_type(entry['path']) == 'photo' and entry['size'] <= AUTO_THUMB_MAX_SOURCE_BYTES
+        ]
+        items = [(path, os.path.join(thumb_dir, f"{index}.jpg")) for index, path in enumerate(images)]
+        self._batches = [items[start:start + AUTO_THUMB_BATCH] for start in range(0, len(items), AUTO_THUMB_BATCH)]
+        self._batch_of = {path: index for index, batch in enumerate(self._batches) for path, _ in batch}
+        self._futures = []
+        self._schedule(AUTO_THUMB_LOOKAHEAD - 1)
+
+    def _schedule(self, last_index):
+        while len(self._futures) <= min(last_index, len(self._batches) - 1):
+            batch = self._batches[len(self._futures)]
+            self._futures.append(asyncio.ensure_future(run_in_pool(make_thumbnails, batch)))
+
+    async def get(self, path):
+        """Thumbnail for an extracted image, or None if it isn't ready in time"""
+        index = self._batch_of.get(path)
+        if index is None:
+            return None
+
+        # Keep the next batches going while this one is uploaded
+        self._schedule(index + AUTO_THUMB_LOOKAHEAD)
+        try:
+            done = await asyncio.wait_for(asyncio.shield(self._futures[index]), AUTO_THUMB_WAIT_SECONDS)
+        except Exception:
+            return None
+        return done.get(path)
+
+    async def close(self):
+        """Wait for batches still running so their folder can be cleaned up"""
+        await asyncio.gather(*self._futures, return_exceptions=True)
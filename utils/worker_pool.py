@@ -0,0 +1,188 @@
+import os
+import shutil
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import MAX_WORKER_PROCESSES, JOB_MEMORY_LIMIT_BYTES
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits
+    resource = None
+
+
+# Modules imported once by the fork server so every worker starts warm
+PRELOAD_MODULES = ['utils.file_handler', 'utils.sevenzip', 'utils.decompress']
+
+# Shared process pool (created lazily on first use)
+_process_pool = None
+
+# Manager process hosting progress dicts shared with workers
+_manager = None
+
+
+def _get_context():
+    """Get multiprocessing context for worker processes"""
+    # Fork from a clean single-threaded server instead of the bot process,
+    # which already runs pyrogram and pymongo threads
+    if os.name == 'posix':
+        # Keep glibc from reserving a malloc arena per decoder thread
+        os.environ.setdefault('MALLOC_ARENA_MAX', '2')
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def get_process_pool():
+    """Get the shared worker process pool"""
+    global _process_pool
+
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=MAX_WORKER_PROCESSES,
+            mp_context=_get_context()
+        )
+    return _process_pool
+
+
+def _current_data_size():
+    """Get the data segment size of this process in bytes (Linux only)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmData:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def set_memory_limit(limit_bytes):
+    """
+    Cap the data segment of the current process
+
+    Args:
+        limit_bytes (int): Allowed growth on top of current usage
+
+    Returns:
+        tuple or None: Previous (soft, hard) limit to restore later
+    """
+    if resource is None or not limit_bytes:
+        return None
+
+    previous = resource.getrlimit(resource.RLIMIT_DATA)
+    soft = _current_data_size() + limit_bytes
+    if previous[1] != resource.RLIM_INFINITY:
+        soft = min(soft, previous[1])
+    resource.setrlimit(resource.RLIMIT_DATA, (soft, previous[1]))
+    return previous
+
+
+def memory_limited_command(command):
+    """
+    Run a native tool under prlimit so its memory cap is set before it starts
+
+    Returns:
+        list: argv, unchanged when prlimit isn't installed
+    """
+    prlimit = shutil.which('prlimit') if os.name == 'posix' else None
+    if not prlimit or not JOB_MEMORY_LIMIT_BYTES:
+        return command
+    return [prlimit, f'--data={JOB_MEMORY_LIMIT_BYTES}:', '--'] + command
+
+
+def limit_child_memory(pid):
+    """Cap a native tool's memory right after spawning it, when prlimit isn't installed"""
+    if resource is None or not hasattr(resource, 'prlimit') or not JOB_MEMORY_LIMIT_BYTES or shutil.which('prlimit'):
+        return
+    try:
+        _, hard = resource.prlimit(pid, resource.RLIMIT_DATA)
+        resource.prlimit(pid, resource.RLIMIT_DATA, (JOB_MEMORY_LIMIT_BYTES, hard))
+    except (OSError, ValueError):
+        pass  # The tool already exited
+
+
+def _run_with_memory_limit(limit_bytes, func, *args):
+    """Run one job inside a worker with its own memory ceiling"""
+    # Allocations over the ceiling raise MemoryError in this job only,
+    # instead of letting the OOM killer take down the bot
+    previous = set_memory_limit(limit_bytes)
+    try:
+        return func(*args)
+    finally:
+        if previous is not None:
+            resource.setrlimit(resource.RLIMIT_DATA, previous)
+
+
+async def run_in_pool(func, *args):
+    """
+    Run a picklable function in the shared worker process pool
+
+    Each call is a separate job capped at JOB_MEMORY_LIMIT_BYTES; going over
+    it raises MemoryError here without affecting other jobs.
+
+    Args:
+        func: Module-level function to run
+        *args: Picklable arguments
+
+    Returns:
+        Whatever func returns
+    """
+    global _process_pool
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_process_pool(), _run_with_memory_limit, JOB_MEMORY_LIMIT_BYTES, func, *args
+        )
+    except BrokenProcessPool:
+        # A worker died - drop the pool so the next job gets a fresh one
+        _process_pool = None
+        raise
+
+
+async def run_in_pool_with_progress(func, progress, *args):
+    """
+    Run a pool job that reports progress through a shared dict
+
+    func is called as func(*args, shared_progress); whatever it stores in
+    the shared dict is copied into ``progress`` every half second so the
+    status updater can read it like a normal dict.
+    """
+    global _manager
+
+    if progress is None:
+        return await run_in_pool(func, *args, None)
+
+    if _manager is None:
+        _manager = _get_context().Manager()
+    # Every call on a manager proxy is a blocking round-trip to the manager
+    # process, so they run in a thread instead of on the event loop
+    shared = await asyncio.to_thread(_manager.dict)
+
+    async def mirror():
+        while True:
+            await asyncio.sleep(0.5)
+            progress.update(await asyncio.to_thread(shared.copy))
+
+    mirror_task = asyncio.create_task(mirror())
+    try:
+        return await run_in_pool(func, *args, shared)
+    finally:
+        mirror_task.cancel()
+        progress.update(await asyncio.to_thread(shared.copy))
+
+
+def shutdown_pool():
+    """Shut down worker processes (called on bot exit)"""
+    global _process_pool, _manager
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None